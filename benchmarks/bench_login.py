@@ -0,0 +1,89 @@
+"""
+Carga de logins concurrentes contra un servidor en marcha.
+
+    python -m benchmarks.bench_login http://localhost:8000 --usuario admin --contrasena secreto
+    python -m benchmarks.bench_login http://localhost:8000 --usuario admin --contrasena secreto \
+        --stream "/video_feed?ip=192.168.1.108&perfil=preview&fps=5"
+
+Lanza --concurrencia logins a la vez durante --segundos y, en paralelo, mide la
+latencia de /salud (sonda del event loop) y, si se indica --stream, el intervalo
+entre frames de un stream MJPEG. Con bcrypt en el loop la sonda y el stream se
+congelan durante el pico; con el pool acotado deben mantenerse estables y los
+logins que no entran reciben 503 de inmediato.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+
+def percentiles(valores):
+    if not valores:
+        return "sin datos"
+    v = sorted(valores)
+    p = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return f"n={len(v)} p50={p(0.5) * 1000:.1f} ms p95={p(0.95) * 1000:.1f} ms max={v[-1] * 1000:.1f} ms"
+
+
+async def logins(client, args, fin, latencias, codigos):
+    cuerpo = {"usuario": args.usuario, "contrasena": args.contrasena}
+    while time.monotonic() < fin:
+        inicio = time.monotonic()
+        r = await client.post("/usuarios/login", json=cuerpo)
+        latencias.append(time.monotonic() - inicio)
+        codigos[r.status_code] = codigos.get(r.status_code, 0) + 1
+
+
+async def sonda(client, fin, latencias):
+    while time.monotonic() < fin:
+        inicio = time.monotonic()
+        await client.get("/salud")
+        latencias.append(time.monotonic() - inicio)
+        await asyncio.sleep(0.05)
+
+
+async def stream(client, ruta, fin, intervalos):
+    async with client.stream("GET", ruta) as r:
+        anterior = None
+        async for bloque in r.aiter_bytes():
+            if b"--frame" in bloque:
+                ahora = time.monotonic()
+                if anterior is not None:
+                    intervalos.append(ahora - anterior)
+                anterior = ahora
+            if time.monotonic() >= fin:
+                break
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--usuario", required=True)
+    parser.add_argument("--contrasena", required=True)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--segundos", type=float, default=20)
+    parser.add_argument("--stream", help="Ruta de un stream MJPEG a observar durante la carga")
+    args = parser.parse_args()
+
+    latencias_login, codigos, latencias_sonda, intervalos_stream = [], {}, [], []
+    limites = httpx.Limits(max_connections=args.concurrencia + 4)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limites) as client:
+        fin = time.monotonic() + args.segundos
+        tareas = [logins(client, args, fin, latencias_login, codigos) for _ in range(args.concurrencia)]
+        tareas.append(sonda(client, fin, latencias_sonda))
+        if args.stream:
+            tareas.append(stream(client, args.stream, fin, intervalos_stream))
+        inicio = time.monotonic()
+        await asyncio.gather(*tareas)
+        duracion = time.monotonic() - inicio
+
+    exitosos = codigos.get(200, 0)
+    print(f"logins: {sum(codigos.values())} en {duracion:.1f} s, {exitosos / duracion:.1f} exitosos/s, códigos {codigos}")
+    print(f"latencia login: {percentiles(latencias_login)}")
+    print(f"latencia /salud: {percentiles(latencias_sonda)}")
+    if args.stream:
+        print(f"intervalo entre frames: {percentiles(intervalos_stream)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Micro-benchmark del post-procesado: bucle por caja (versión anterior de
+procesar_frame) contra el camino actual sobre boxes.data: separar/dentro_de
+(procesar_frame) y la medición del ImpactTracker. "recalcula" es un tracker
+nuevo (el snapshot cambia y se miden celda y medidas); "estable" es el caso
+habitual de un frame con los mismos impactos ya confirmados.
+
+    python -m benchmarks.bench_postproceso
+
+Usa ultralytics.engine.results.Boxes si está instalado; si no, un sustituto
+NumPy con el mismo acceso por caja (que subestima el costo real del bucle).
+"""
+import time
+import numpy as np
+from conf_camara import postproceso
+from conf_camara.tracker import ImpactTracker
+
+NAMES = {0: "hoja", 1: "impacto"}
+
+
+class _BoxesNumpy:
+    """Sustituto mínimo de ultralytics Boxes: iterable por caja y con .data."""
+
+    def __init__(self, data):
+        self.data = data
+        self.cls, self.conf, self.xyxy = data[:, 5], data[:, 4], data[:, :4]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return (_BoxesNumpy(self.data[i:i + 1]) for i in range(len(self.data)))
+
+
+class _Result:
+    def __init__(self, data):
+        try:
+            import torch
+            from ultralytics.engine.results import Boxes
+            self.boxes = Boxes(torch.from_numpy(data), (720, 1280))
+        except ImportError:
+            self.boxes = _BoxesNumpy(data)
+
+
+def por_caja(results, names):
+    """Implementación anterior de procesar_frame (sin inferencia)."""
+    best_box = None
+    impactos = []
+    for r in results:
+        for box in r.boxes:
+            cls = int(box.cls[0])
+            conf = float(box.conf[0])
+            if names[cls] == "hoja":
+                if conf > (float(best_box.conf[0]) if best_box else 0):
+                    best_box = box
+            elif names[cls] == "impacto":
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                cx, cy = (x1 + x2)//2, (y1 + y2)//2
+                impactos.append(((x1, y1, x2, y2), (cx, cy)))
+    if best_box is None:
+        return {"hoja": None, "impactos": [], "celda": None, "medidas": ""}
+    snapshot = {"hoja": [float(v) for v in best_box.xyxy[0]], "impactos": [], "celda": None, "medidas": ""}
+    hx1, hy1, hx2, hy2 = map(int, best_box.xyxy[0])
+    impactos_dentro = [imp for imp in impactos if hx1 <= imp[1][0] <= hx2 and hy1 <= imp[1][1] <= hy2]
+    snapshot["impactos"] = impactos_dentro
+    if impactos_dentro:
+        centros = [c for _, c in impactos_dentro]
+        centros_sorted_x = sorted(centros, key=lambda p: p[0])
+        centros_sorted_y = sorted(centros, key=lambda p: p[1])
+        x1_celda, x2_celda = centros_sorted_x[0][0], centros_sorted_x[-1][0]
+        y1_celda, y2_celda = centros_sorted_y[0][1], centros_sorted_y[-1][1]
+        snapshot["celda"] = (x1_celda, y1_celda, x2_celda, y2_celda)
+        ratio_x = postproceso.HOJA_ANCHO_CM / (hx2 - hx1)
+        ratio_y = postproceso.HOJA_ALTO_CM / (hy2 - hy1)
+        ancho_cm = round((x2_celda - x1_celda) * ratio_x, 2)
+        alto_cm = round((y2_celda - y1_celda) * ratio_y, 2)
+        suma_cm = round(ancho_cm + alto_cm, 2)
+        snapshot["medidas"] = f"Ancho: {ancho_cm} cm  Alto: {alto_cm} cm  Suma: {suma_cm} cm"
+    return snapshot
+
+
+def detectar(result, names):
+    """Post-procesado de procesar_frame sin tiles: hoja e impactos dentro de ella."""
+    hoja, bboxes = postproceso.separar(postproceso.detecciones_array(result), names)
+    if hoja is None:
+        return None, bboxes[:0]
+    return hoja, bboxes[postproceso.dentro_de(postproceso.centros(bboxes), hoja.astype(np.int64))]
+
+
+def actual(result, names, tracker=None):
+    tracker = tracker or ImpactTracker(min_hits=1)
+    tracker.actualizar(*detectar(result, names))
+    return tracker.snapshot
+
+
+def generar(n, rng):
+    data = np.zeros((n, 6), np.float32)
+    xy = rng.uniform([300, 100], [900, 600], size=(n, 2))
+    data[:, 0:2], data[:, 2:4] = xy, xy + rng.uniform(4, 12, size=(n, 2))
+    data[:, 4] = rng.uniform(0.5, 1.0, n)
+    data[:, 5] = 1
+    data[:2] = [[280, 80, 960, 650, 0.93, 0], [290, 90, 950, 640, 0.81, 0]]
+    return data
+
+
+def medir(fn, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for n in (10, 100, 500):
+        data = generar(n, rng)
+        result = _Result(data)
+        snapshot = actual(result, NAMES)
+        campos = ("hoja", "impactos", "celda", "medidas")
+        assert por_caja([result], NAMES) == {k: snapshot[k] for k in campos}, "los resultados no coinciden"
+        estable = ImpactTracker(min_hits=1)
+        actual(result, NAMES, estable)
+        repeticiones = max(20, 2000 // n)
+        t_caja = medir(lambda: por_caja([result], NAMES), repeticiones)
+        t_rec = medir(lambda: actual(result, NAMES), repeticiones)
+        t_est = medir(lambda: actual(result, NAMES, estable), repeticiones)
+        print(f"{n:4d} cajas  por caja {t_caja:9.1f} us  recalcula {t_rec:8.1f} us  x{t_caja / t_rec:5.1f}"
+              f"  estable {t_est:8.1f} us  x{t_caja / t_est:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
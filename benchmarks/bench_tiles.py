@@ -0,0 +1,57 @@
+"""
+Latencia de la inferencia por tiles según cantidad de tiles, en CPU.
+
+    python -m benchmarks.bench_tiles modelo/calibracion/frame.jpg
+
+Para cada tamaño de tile corre la región completa del frame varias veces a
+través del InferenceScheduler (como en producción) y muestra tiles, latencia
+media/p95 e impactos detectados, contra la pasada única de frame completo.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from conf_camara import postproceso
+from conf_camara.config import MODEL_IMGSZ, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS
+from conf_camara.engine import cargar_modelo
+from conf_camara.inference import InferenceScheduler
+from conf_camara.tiles import InferenciaTiles, generar_tiles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("frame", help="Imagen 1280x720 de la cámara")
+    parser.add_argument("--tiles", nargs="+", type=int, default=[640, 480, 320])
+    parser.add_argument("--solape", type=int, default=64)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.frame)
+    if frame is None:
+        raise SystemExit(f"No se pudo leer {args.frame}")
+    model = cargar_modelo()
+    scheduler = InferenceScheduler(lambda imgs: model(imgs, imgsz=MODEL_IMGSZ, conf=0.5, verbose=False),
+                                   INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS)
+    id_impacto = postproceso.id_clase(model.names, "impacto")
+
+    tiempos = []
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        data = postproceso.detecciones_array(scheduler.inferir(frame))
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    impactos = int((data[:, 5] == id_impacto).sum())
+    print(f"frame completo   tiles  1  medio {np.mean(tiempos):7.1f} ms  p95 {np.percentile(tiempos, 95):7.1f} ms  impactos {impactos}")
+
+    for tile in args.tiles:
+        inferencia = InferenciaTiles(scheduler, tile, args.solape, presupuesto_ms=60_000)
+        n = len(generar_tiles((0, 0, frame.shape[1], frame.shape[0]), tile, args.solape))
+        tiempos = []
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            data = inferencia.detectar(frame, id_clase=id_impacto)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"tile {tile:4d}        tiles {n:2d}  medio {np.mean(tiempos):7.1f} ms  p95 {np.percentile(tiempos, 95):7.1f} ms  impactos {len(data)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Costo fijo estimado por entrada (clave, tupla, encabezado del arreglo)
+_OVERHEAD_ENTRADA = 256
+
+
+class CacheDetecciones:
+    """
+    LRU acotada en bytes para las detecciones crudas (boxes.data) de una ROI.
+    La clave incluye cámara, secuencia de frame, ROI y versión del modelo, así
+    que una entrada nunca queda obsoleta: solo se desaloja por tamaño. Pedidos
+    idénticos concurrentes esperan la misma inferencia en vuelo.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._en_vuelo = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidos = 0
+
+    def obtener(self, clave, calcular):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            future = self._en_vuelo.get(clave)
+            propietario = future is None
+            if propietario:
+                future = Future()
+                self._en_vuelo[clave] = future
+                self.fallos += 1
+            else:
+                self.coalescidos += 1
+        if not propietario:
+            return future.result()
+        try:
+            valor = calcular()
+        except BaseException as e:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._guardar(clave, valor)
+            self._en_vuelo.pop(clave, None)
+        future.set_result(valor)
+        return valor
+
+    def _guardar(self, clave, valor):
+        if valor is None:
+            return
+        tamano = valor.nbytes + _OVERHEAD_ENTRADA
+        if tamano > self.max_bytes:
+            return
+        self._datos[clave] = valor
+        self._bytes += tamano
+        while self._bytes > self.max_bytes:
+            _, viejo = self._datos.popitem(last=False)
+            self._bytes -= viejo.nbytes + _OVERHEAD_ENTRADA
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "coalescidos": self.coalescidos,
+                "en_vuelo": len(self._en_vuelo),
+            }
@@ -0,0 +1,141 @@
+"""
+Calibración de la hoja: homografía imagen -> hoja en cm.
+
+La bbox de la hoja es alineada a los ejes, así que bajo perspectiva un ratio
+cm/píxel único mide mal. Aquí se estiman las cuatro esquinas reales de la hoja
+(contorno dentro de la bbox, o las esquinas de la bbox si no se encuentra un
+cuadrilátero confiable) y se calcula la homografía una sola vez; se reutiliza
+mientras la bbox de la hoja siga estable (IoU >= iou_estable). Todos los centros
+se pasan a cm en una única transformación vectorizada.
+"""
+import logging
+import cv2
+import numpy as np
+from . import postproceso
+from .postproceso import HOJA_ANCHO_CM, HOJA_ALTO_CM
+from .config import TRACKER_IOU_HOJA, CALIBRACION_REFINAR, CALIBRACION_MARGEN
+
+logger = logging.getLogger(__name__)
+
+# Esquinas de la hoja en cm: sup-izq, sup-der, inf-der, inf-izq
+_DESTINO = np.float32([[0, 0], [HOJA_ANCHO_CM, 0], [HOJA_ANCHO_CM, HOJA_ALTO_CM], [0, HOJA_ALTO_CM]])
+
+
+def _ordenar_esquinas(pts):
+    """Ordena 4 puntos como sup-izq, sup-der, inf-der, inf-izq."""
+    suma = pts.sum(axis=1)
+    resta = pts[:, 1] - pts[:, 0]
+    return np.array([pts[np.argmin(suma)], pts[np.argmin(resta)], pts[np.argmax(suma)], pts[np.argmax(resta)]])
+
+
+def esquinas_bbox(hoja_int):
+    hx1, hy1, hx2, hy2 = (int(v) for v in hoja_int)
+    return np.float64([[hx1, hy1], [hx2, hy1], [hx2, hy2], [hx1, hy2]])
+
+
+def esquinas_hoja(frame, hoja_int, margen: int = CALIBRACION_MARGEN, area_min: float = 0.6):
+    """
+    (esquinas, refinada): el cuadrilátero de la hoja dentro de su bbox (más un
+    margen) en coordenadas del frame, o las esquinas de la bbox si no se halla uno
+    que cubra al menos area_min de la bbox.
+    """
+    fallback = esquinas_bbox(hoja_int)
+    if frame is None:
+        return fallback, False
+    hx1, hy1, hx2, hy2 = (int(v) for v in hoja_int)
+    alto, ancho = frame.shape[:2]
+    x1, y1 = max(0, hx1 - margen), max(0, hy1 - margen)
+    x2, y2 = min(ancho, hx2 + margen), min(alto, hy2 + margen)
+    if x2 - x1 < 8 or y2 - y1 < 8:
+        return fallback, False
+    gris = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    # La hoja es la región clara dominante del recorte
+    _, mascara = cv2.threshold(gris, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contornos:
+        return fallback, False
+    contorno = max(contornos, key=cv2.contourArea)
+    aprox = cv2.approxPolyDP(contorno, 0.02 * cv2.arcLength(contorno, True), True)
+    if len(aprox) != 4 or cv2.contourArea(aprox) < area_min * (hx2 - hx1) * (hy2 - hy1):
+        return fallback, False
+    pts = aprox.reshape(4, 2).astype(np.float64) + (x1, y1)
+    return _ordenar_esquinas(pts), True
+
+
+def dispersion(puntos_cm):
+    """Tamaño de grupo (mayor distancia entre dos impactos) y punto medio de impacto, en cm."""
+    if len(puntos_cm) == 0:
+        return None
+    diff = puntos_cm[:, None, :] - puntos_cm[None, :, :]
+    grupo = float(np.sqrt((diff ** 2).sum(axis=2)).max())
+    centro = puntos_cm.mean(axis=0)
+    return {
+        "impactos": len(puntos_cm),
+        "grupo_cm": round(grupo, 2),
+        "punto_medio_cm": [round(float(centro[0]), 2), round(float(centro[1]), 2)],
+    }
+
+
+class CalibracionHoja:
+    """Homografía de la hoja cacheada por pose de cámara; una instancia por sesión."""
+
+    def __init__(self, iou_estable: float = TRACKER_IOU_HOJA, refinar: bool = CALIBRACION_REFINAR):
+        self.iou_estable = iou_estable
+        self.refinar = refinar
+        # (hoja, homografía, esquinas refinadas?) se reemplaza de una vez para lectores concurrentes
+        self._estado = None
+        self.calculos = 0
+
+    def reiniciar(self):
+        self._estado = None
+
+    def actualizar(self, frame, hoja):
+        """Recalcula la homografía solo si la hoja es nueva o se movió. Devuelve True si la recalculó."""
+        if hoja is None:
+            return False
+        hoja = [float(v) for v in hoja]
+        estado = self._estado
+        if estado is not None and postproceso.iou(estado[0], hoja) >= self.iou_estable:
+            return False
+        hoja_int = np.asarray(hoja).astype(np.int64)
+        esquinas, refinada = esquinas_hoja(frame if self.refinar else None, hoja_int)
+        homografia = cv2.getPerspectiveTransform(esquinas.astype(np.float32), _DESTINO).astype(np.float64)
+        self._estado = (hoja, homografia, refinada)
+        self.calculos += 1
+        logger.debug("Homografía de hoja recalculada (esquinas refinadas: %s)", refinada)
+        return True
+
+    def vigente(self, hoja_int):
+        """True si hay una homografía calculada para esta hoja (misma pose)."""
+        estado = self._estado
+        return estado is not None and postproceso.iou(estado[0], hoja_int) >= self.iou_estable
+
+    def homografia(self, hoja_int):
+        """Homografía vigente, o la de la bbox si aún no hay calibración para esta hoja."""
+        estado = self._estado
+        if estado is not None and postproceso.iou(estado[0], hoja_int) >= self.iou_estable:
+            return estado[1]
+        return cv2.getPerspectiveTransform(esquinas_bbox(hoja_int).astype(np.float32), _DESTINO).astype(np.float64)
+
+    @staticmethod
+    def a_cm(homografia, puntos):
+        """Centros (N x 2, píxeles) a coordenadas de la hoja en cm, en una sola transformación."""
+        p = np.asarray(puntos, np.float64).reshape(-1, 2)
+        h = p @ homografia[:, :2].T + homografia[:, 2]
+        return h[:, :2] / h[:, 2:3]
+
+    def medir(self, centros_dentro, hoja_int):
+        """Celda en píxeles, texto de medidas en cm y dispersión; (None, "", None) si no hay impactos."""
+        if len(centros_dentro) == 0:
+            return None, "", None
+        x1_celda, y1_celda = centros_dentro.min(axis=0).tolist()
+        x2_celda, y2_celda = centros_dentro.max(axis=0).tolist()
+        cm = self.a_cm(self.homografia(hoja_int), centros_dentro)
+        ancho_cm, alto_cm = np.ptp(cm, axis=0).tolist()
+        medidas = postproceso.texto_medidas(ancho_cm, alto_cm)
+        return (x1_celda, y1_celda, x2_celda, y2_celda), medidas, dispersion(cm)
+
+    def estadisticas(self):
+        estado = self._estado
+        return {"calibrada": estado is not None, "esquinas_refinadas": bool(estado and estado[2]),
+                "calculos_homografia": self.calculos}
@@ -0,0 +1,50 @@
+import time
+import cv2
+import numpy as np
+from .config import CAMBIO_TAMANO, CAMBIO_UMBRAL_PIXEL, CAMBIO_MIN_PIXELES, CAMBIO_REFRESCO_FORZADO
+
+
+class DetectorCambio:
+    """
+    Decide si vale la pena correr el modelo sobre un frame. Compara una versión
+    reducida en escala de grises contra el último frame que sí se infirió y cuenta
+    los píxeles que cambiaron más de umbral_pixel; un impacto nuevo cambia unos
+    pocos píxeles concentrados, el ruido de compresión no supera el umbral.
+    Cada refresco_forzado segundos se infiere igual aunque no haya cambios.
+    """
+
+    def __init__(self, tamano=CAMBIO_TAMANO, umbral_pixel=CAMBIO_UMBRAL_PIXEL,
+                 min_pixeles=CAMBIO_MIN_PIXELES, refresco_forzado=CAMBIO_REFRESCO_FORZADO):
+        self.tamano = tamano
+        self.umbral_pixel = umbral_pixel
+        self.min_pixeles = min_pixeles
+        self.refresco_forzado = refresco_forzado
+        self._referencia = None
+        self._ultima_inferencia = 0.0
+        self.inferidos = 0
+        self.omitidos = 0
+
+    def _reducir(self, frame):
+        gris = cv2.cvtColor(cv2.resize(frame, self.tamano, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gris, (3, 3), 0)
+
+    def debe_inferir(self, frame) -> bool:
+        reducido = self._reducir(frame)
+        ahora = time.monotonic()
+        cambio = (self._referencia is None
+                  or ahora - self._ultima_inferencia >= self.refresco_forzado
+                  or int(np.count_nonzero(cv2.absdiff(reducido, self._referencia) > self.umbral_pixel)) >= self.min_pixeles)
+        if cambio:
+            self._referencia = reducido
+            self._ultima_inferencia = ahora
+            self.inferidos += 1
+        else:
+            self.omitidos += 1
+        return cambio
+
+    def reiniciar(self):
+        """Fuerza la inferencia del próximo frame (p. ej. al reanudar la detección)."""
+        self._referencia = None
+
+    def estadisticas(self):
+        return {"frames_inferidos": self.inferidos, "frames_omitidos": self.omitidos}
@@ -1,122 +1,121 @@
-import cv2
 import numpy as np
-import subprocess
-import threading
 import time
+import logging
 from fastapi.responses import StreamingResponse
-from .config import RTSP_USER, RTSP_PASS, RTSP_PORT, RTSP_CHANNEL, RTSP_SUBTYPE
-import imageio_ffmpeg as ffmpeg_dl
-from ultralytics import YOLO
-
-stop_streaming = False
-pause_detection = False
-current_frame = None
-frame_lock = threading.Lock()
-model = YOLO("modelo/train100/best.pt")
-
-HOJA_ANCHO_CM = 21.59
-HOJA_ALTO_CM = 27.94
-
-last_best_box = None
-last_impactos = []
-last_celda_coords = None
-last_medidas_texto = ""
-
-def get_rtsp_url(ip: str):
-    return f"rtsp://{RTSP_USER}:{RTSP_PASS}@{ip}:{RTSP_PORT}/cam/realmonitor?channel={RTSP_CHANNEL}&subtype={RTSP_SUBTYPE}&transportmode=tcp"
-
-def read_rtsp_stream(ip: str):
-    global stop_streaming, current_frame
-    rtsp_url = get_rtsp_url(ip)
-    ffmpeg_path = ffmpeg_dl.get_ffmpeg_exe()
-    width, height = 1280, 720
-    frame_size = width * height * 3
-    command = [ffmpeg_path, "-rtsp_transport", "tcp", "-i", rtsp_url, "-s", f"{width}x{height}",
-               "-f", "image2pipe", "-pix_fmt", "bgr24", "-vcodec", "rawvideo", "-"]
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=10**8)
-    while not stop_streaming:
-        raw_frame = process.stdout.read(frame_size)
-        if len(raw_frame) != frame_size:
-            continue
-        try:
-            frame = np.frombuffer(raw_frame, np.uint8).reshape((height, width, 3)).copy()
-            with frame_lock:
-                if not pause_detection:
-                    current_frame = frame
-        except:
-            continue
-    process.terminate()
-
-def generate_video_stream(ip: str):
-    global stop_streaming, pause_detection, current_frame
-    global last_best_box, last_impactos, last_celda_coords, last_medidas_texto
-    stop_streaming = False
-    pause_detection = False
-    current_frame = None
-    last_best_box = None
-    last_impactos = []
-    last_celda_coords = None
-    last_medidas_texto = ""
-    threading.Thread(target=read_rtsp_stream, args=(ip,), daemon=True).start()
-    
-    while not stop_streaming:
-        start_time = time.time()
-        with frame_lock:
-            frame = None if current_frame is None else current_frame.copy()
+from .config import DETECTION_INTERVAL, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, MODEL_IMGSZ, STREAM_FPS, STREAM_MAX_FPS, STREAM_PROFILES, DETECCIONES_CACHE_MB
+from .config import TILES_ACTIVO, TILE_TAMANO, TILE_SOLAPE, TILE_MARGEN_HOJA, TILES_PRESUPUESTO_MS
+from .captura import get_rtsp_url  # noqa: F401 (se mantiene importable desde camera)
+from .session import CameraSession, SessionRegistry, SNAPSHOT_VACIO
+from .inference import InferenceScheduler
+from .mjpeg import stream_mjpeg
+from . import postproceso
+from .reconciliacion import IndiceImpactos, TOLERANCIA_IMPACTO
+from .cache_roi import CacheDetecciones
+from .calibracion import CalibracionHoja
+from .tiles import InferenciaTiles
+from .engine import cargar_modelo
+from .model_registry import ModelRegistry
+from monitoreo.metricas import Contador, Histograma, Medidor
+
+logger = logging.getLogger(__name__)
+
+# Se carga en segundo plano (ver main.py); nada pesado ocurre al importar el módulo
+modelos = ModelRegistry(cargar_modelo)
+
+def predecir_lote(imagenes):
+    return modelos.obtener()(imagenes, imgsz=MODEL_IMGSZ, conf=0.5)
+
+scheduler = InferenceScheduler(predecir_lote, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS)
+cache_roi = CacheDetecciones(DETECCIONES_CACHE_MB * 1024 * 1024)
+tiles = InferenciaTiles(scheduler, TILE_TAMANO, TILE_SOLAPE, TILES_PRESUPUESTO_MS)
+
+CICLO_DETECCION = Histograma("deteccion_ciclo_segundos", "Ciclo completo de detección de un frame")
+POSTPROCESO = Histograma("deteccion_postproceso_segundos", "Post-procesado de las detecciones (sin la inferencia)")
+SIN_CAMBIO = Contador("deteccion_frames_sin_cambio_total", "Frames en los que se reutilizó la detección anterior")
+DETECTAR_AREA = Histograma("detectar_area_segundos", "Duración de detectar_area")
+Medidor("inferencia_cola", "Imágenes esperando inferencia", lambda: scheduler.en_cola())
+
+def read_rtsp_stream(session: CameraSession):
+    session.captura.ejecutar(session)
+
+def read_preview_stream(session: CameraSession):
+    if session.captura_preview is not None:
+        session.captura_preview.ejecutar(session)
+
+def capture_watchdog(session: CameraSession):
+    while not session.stop_event.wait(1.0):
+        for captura in session.capturas:
+            captura.vigilar()
+
+def procesar_frame(frame):
+    """Ejecuta el modelo sobre el frame completo; devuelve la hoja y los impactos dentro de ella."""
+    model = modelos.obtener()
+    resultado = scheduler.inferir(frame)
+    inicio = time.perf_counter()
+    data = postproceso.detecciones_array(resultado)
+    hoja, bboxes = postproceso.separar(data, model.names)
+    if hoja is None:
+        POSTPROCESO.observar(time.perf_counter() - inicio)
+        return None, bboxes[:0]
+    if TILES_ACTIVO:
+        # La hoja sale de la pasada completa; los impactos, de tiles sin reducir sobre la hoja
+        hx1, hy1, hx2, hy2 = hoja.tolist()
+        region = (hx1 - TILE_MARGEN_HOJA, hy1 - TILE_MARGEN_HOJA, hx2 + TILE_MARGEN_HOJA, hy2 + TILE_MARGEN_HOJA)
+        data_tiles = tiles.detectar(frame, region, postproceso.id_clase(model.names, "impacto"))
+        inicio = time.perf_counter()
+        bboxes = data_tiles[:, :4].astype(np.int64)
+    dentro = postproceso.dentro_de(postproceso.centros(bboxes), hoja.astype(np.int64))
+    POSTPROCESO.observar(time.perf_counter() - inicio)
+    return hoja, bboxes[dentro]
+
+def detection_loop(session: CameraSession):
+    """Único lugar donde corre el modelo para esta cámara; el video se codifica aparte."""
+    seq = 0
+    while not session.detenido:
+        seq, frame = session.ring.esperar(seq, timeout=1.0)
         if frame is None:
             continue
+        start_time = time.time()
         try:
-            if not pause_detection:
-                results = model(frame, imgsz=640, conf=0.5)
-                best_box = None
-                impactos = []
-                for r in results:
-                    for box in r.boxes:
-                        cls = int(box.cls[0])
-                        conf = float(box.conf[0])
-                        if model.names[cls] == "hoja":
-                            if conf > (best_box.conf if best_box else 0):
-                                best_box = box
-                        elif model.names[cls] == "impacto":
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            cx, cy = (x1 + x2)//2, (y1 + y2)//2
-                            impactos.append(((x1, y1, x2, y2), (cx, cy)))
-                last_best_box = best_box
-                if best_box is not None:
-                    hx1, hy1, hx2, hy2 = map(int, best_box.xyxy[0])
-                    impactos_dentro = [imp for imp in impactos if hx1 <= imp[1][0] <= hx2 and hy1 <= imp[1][1] <= hy2]
-                    last_impactos = impactos_dentro
-                    if impactos_dentro:
-                        centros = [c for _, c in impactos_dentro]
-                        centros_sorted_x = sorted(centros, key=lambda p: p[0])
-                        centros_sorted_y = sorted(centros, key=lambda p: p[1])
-                        x1_celda = centros_sorted_x[0][0]
-                        y1_celda = centros_sorted_y[0][1]
-                        x2_celda = centros_sorted_x[-1][0]
-                        y2_celda = centros_sorted_y[-1][1]
-                        last_celda_coords = (x1_celda, y1_celda, x2_celda, y2_celda)
-                        px_hoja_ancho = hx2 - hx1
-                        px_hoja_alto = hy2 - hy1
-                        ratio_x = HOJA_ANCHO_CM / px_hoja_ancho
-                        ratio_y = HOJA_ALTO_CM / px_hoja_alto
-                        ancho_cm = round((x2_celda - x1_celda) * ratio_x, 2)
-                        alto_cm = round((y2_celda - y1_celda) * ratio_y, 2)
-                        suma_cm = round(ancho_cm + alto_cm, 2)
-                        last_medidas_texto = f"Ancho: {ancho_cm} cm  Alto: {alto_cm} cm  Suma: {suma_cm} cm"
+            if not session.pause_detection and modelos.listo:
+                if session.cambio.debe_inferir(frame) or session.ultima_deteccion is None:
+                    deteccion = procesar_frame(frame)
+                    # Si el ring reutilizó el slot mientras lo leíamos, el resultado no es confiable.
+                    # La referencia del detector ya es este frame: se descarta para que el
+                    # próximo se infiera en lugar de compararse contra uno nunca publicado
+                    if not session.ring.valida(seq):
+                        session.cambio.reiniciar()
+                        continue
+                    # La homografía se recalcula solo si la hoja es nueva o se movió
+                    session.calibracion.actualizar(frame, deteccion[0])
+                    session.ultima_deteccion = deteccion
+                    # Solo una inferencia real cuenta como hit o miss para el tracker;
+                    # en un frame sin cambios el snapshot publicado sigue vigente
+                    if session.tracker.actualizar(*deteccion):
+                        session.publicar(session.tracker.snapshot)
                 else:
-                    last_impactos = []
-                    last_celda_coords = None
-                    last_medidas_texto = ""
-            success, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
-            if not success:
-                continue
-            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buffer.tobytes() + b"\r\n"
-        except Exception as e:
-            print(f"Error en detección: {e}")
-            continue
+                    SIN_CAMBIO.inc()
+                CICLO_DETECCION.observar(time.time() - start_time)
+        except Exception:
+            logger.exception("Error en detección")
         elapsed = time.time() - start_time
-        if elapsed < 1.0:
-            time.sleep(1.0 - elapsed)
+        if elapsed < DETECTION_INTERVAL:
+            session.stop_event.wait(DETECTION_INTERVAL - elapsed)
+
+registry = SessionRegistry((read_rtsp_stream, read_preview_stream, capture_watchdog, detection_loop))
+Medidor("camaras_activas", "Sesiones de cámara abiertas", lambda: len(registry.sesiones()))
+Medidor("video_visores", "Visores de video conectados", lambda: sum(s.refs for s in registry.sesiones()))
+
+def obtener_snapshot(camara: str = None):
+    session = registry.obtener(camara)
+    return SNAPSHOT_VACIO if session is None else session.snapshot
+
+def generate_video_stream(ip: str, camara: str = None, perfil: str = "full", fps: float = STREAM_FPS):
+    session = registry.adquirir(camara or ip, ip)
+    try:
+        yield from stream_mjpeg(session, perfil, min(max(fps, 0.1), STREAM_MAX_FPS))
+    finally:
+        registry.liberar(session)
 
 def impactos_se_solapan(bbox1, bbox2, tolerancia=5):
     """
@@ -138,102 +137,93 @@ def impactos_se_solapan(bbox1, bbox2, tolerancia=5):
     # Si la distancia entre centros es menor que la tolerancia, son el mismo impacto
     return distancia < tolerancia
 
-def detectar_area(x1: int, y1: int, x2: int, y2: int, impactos_manual=None, impactos_eliminados=None):
+class RoiInvalida(ValueError):
+    """El área pedida no se superpone con el frame."""
+
+def recortar_roi(x1: int, y1: int, x2: int, y2: int, ancho: int, alto: int):
+    """Recorta el área a los límites del frame; RoiInvalida si queda vacía."""
+    x1, x2 = max(0, min(x1, ancho)), max(0, min(x2, ancho))
+    y1, y2 = max(0, min(y1, alto)), max(0, min(y2, alto))
+    if x1 >= x2 or y1 >= y2:
+        raise RoiInvalida(f"El área ({x1}, {y1}, {x2}, {y2}) queda vacía dentro del frame de {ancho}x{alto}")
+    return x1, y1, x2, y2
+
+def detectar_area(x1: int, y1: int, x2: int, y2: int, impactos_manual=None, impactos_eliminados=None, camara: str = None):
+    inicio = time.perf_counter()
+    try:
+        return _detectar_area(x1, y1, x2, y2, impactos_manual, impactos_eliminados, camara)
+    finally:
+        DETECTAR_AREA.observar(time.perf_counter() - inicio)
+
+def _detectar_area(x1: int, y1: int, x2: int, y2: int, impactos_manual=None, impactos_eliminados=None, camara: str = None):
     """
     Detecta objetos en el área visible y retorna coordenadas ABSOLUTAS 
     (respecto al frame completo de 1280x720)
     impactos_manual: lista de impactos agregados manualmente [{bbox: [x1,y1,x2,y2]}]
     impactos_eliminados: lista de impactos eliminados [{bbox: [x1,y1,x2,y2]}]
     """
-    with frame_lock:
-        frame = None if current_frame is None else current_frame.copy()
+    session = registry.obtener(camara)
+    if session is None:
+        return None
+    seq, frame = session.ring.ultimo()
     if frame is None:
         return None
-    
-    # Extraer ROI (región de interés)
-    roi = frame[y1:y2, x1:x2]
-    results = model(roi, imgsz=640, conf=0.5)
-    
-    best_box = None
-    impactos = []
-    
-    for r in results:
-        for box in r.boxes:
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            if model.names[cls] == "hoja":
-                if conf > (best_box[1] if best_box else 0):
-                    best_box = (box, conf)
-            elif model.names[cls] == "impacto":
-                x1b, y1b, x2b, y2b = map(int, box.xyxy[0])
-                abs_x1 = x1b + x1
-                abs_y1 = y1b + y1
-                abs_x2 = x2b + x1
-                abs_y2 = y2b + y1
-                cx, cy = (abs_x1 + abs_x2)//2, (abs_y1 + abs_y2)//2
-                
-                # Verificar si este impacto está en la lista de eliminados
-                bbox_actual = (abs_x1, abs_y1, abs_x2, abs_y2)
-                esta_eliminado = False
-                if impactos_eliminados:
-                    for imp_elim in impactos_eliminados:
-                        bbox_elim = tuple(imp_elim['bbox'])
-                        if impactos_se_solapan(bbox_actual, bbox_elim, tolerancia=10):
-                            esta_eliminado = True
-                            print(f"Impacto eliminado encontrado: {bbox_actual} coincide con {bbox_elim}")
-                            break
-                
-                # Solo agregar si no está eliminado
-                if not esta_eliminado:
-                    impactos.append(((abs_x1, abs_y1, abs_x2, abs_y2), (cx, cy)))
-    
-    # Agregar impactos manuales si existen
-    if impactos_manual:
-        for imp in impactos_manual:
-            bbox = imp['bbox']
-            x1m, y1m, x2m, y2m = bbox
-            cx, cy = (x1m + x2m)//2, (y1m + y2m)//2
-            impactos.append(((int(x1m), int(y1m), int(x2m), int(y2m)), (int(cx), int(cy))))
-    
+    # Antes de encolar: un recorte vacío haría fallar el lote compartido con otras cámaras
+    x1, y1, x2, y2 = recortar_roi(x1, y1, x2, y2, frame.shape[1], frame.shape[0])
+    model = modelos.obtener()
+
+    def inferir_roi():
+        # Se copia solo el recorte (no el frame completo) y se verifica que el slot siga vigente
+        roi = frame[y1:y2, x1:x2].copy()
+        if not session.ring.valida(seq):
+            return None
+        return postproceso.detecciones_array(scheduler.inferir(roi))
+
+    # Las detecciones crudas se cachean; eliminados y manuales se aplican en cada pedido
+    data = cache_roi.obtener((session.camera_id, seq, x1, y1, x2, y2, modelos.version), inferir_roi)
+    if data is None:
+        return None
+    hoja, bboxes = postproceso.separar(data, model.names)
+    bboxes = bboxes + (x1, y1, x1, y1)
+    centros = postproceso.centros(bboxes)
+
+    # Descartar los impactos que el usuario eliminó
+    if impactos_eliminados and len(bboxes):
+        eliminados = IndiceImpactos([imp['bbox'] for imp in impactos_eliminados], TOLERANCIA_IMPACTO)
+        conservar = ~eliminados.mascara(bboxes.tolist())
+        if not conservar.all():
+            logger.debug("%d impactos detectados coinciden con eliminados", int((~conservar).sum()))
+        bboxes, centros = bboxes[conservar], centros[conservar]
+
+    # Agregar impactos manuales que el modelo no haya detectado ya
+    if impactos_manual and len(bboxes):
+        detectados = IndiceImpactos(bboxes.tolist(), TOLERANCIA_IMPACTO)
+        impactos_manual = [imp for imp in impactos_manual if not detectados.cerca(imp['bbox'])]
+    bboxes_manual, centros_manual = postproceso.impactos_manuales(impactos_manual)
+    bboxes = np.concatenate([bboxes, bboxes_manual])
+    centros = np.concatenate([centros, centros_manual])
+
     celda_coords = None
     medidas_texto = ""
     hoja_bbox = None
-    
-    if best_box is not None:
-        box_obj = best_box[0]
-        hx1, hy1, hx2, hy2 = map(int, box_obj.xyxy[0])
-        abs_hx1 = hx1 + x1
-        abs_hy1 = hy1 + y1
-        abs_hx2 = hx2 + x1
-        abs_hy2 = hy2 + y1
-        hoja_bbox = [abs_hx1, abs_hy1, abs_hx2, abs_hy2]
-        
-        if impactos:
-            impactos_dentro = [imp for imp in impactos if abs_hx1 <= imp[1][0] <= abs_hx2 and abs_hy1 <= imp[1][1] <= abs_hy2]
-            
-            if impactos_dentro:
-                centros = [c for _, c in impactos_dentro]
-                centros_sorted_x = sorted(centros, key=lambda p: p[0])
-                centros_sorted_y = sorted(centros, key=lambda p: p[1])
-                
-                x1_celda = centros_sorted_x[0][0]
-                y1_celda = centros_sorted_y[0][1]
-                x2_celda = centros_sorted_x[-1][0]
-                y2_celda = centros_sorted_y[-1][1]
-                celda_coords = (x1_celda, y1_celda, x2_celda, y2_celda)
-                
-                px_hoja_ancho = abs_hx2 - abs_hx1
-                px_hoja_alto = abs_hy2 - abs_hy1
-                ratio_x = HOJA_ANCHO_CM / px_hoja_ancho
-                ratio_y = HOJA_ALTO_CM / px_hoja_alto
-                ancho_cm = round((x2_celda - x1_celda) * ratio_x, 2)
-                alto_cm = round((y2_celda - y1_celda) * ratio_y, 2)
-                suma_cm = round(ancho_cm + alto_cm, 2)
-                medidas_texto = f"Ancho: {ancho_cm} cm  Alto: {alto_cm} cm  Suma: {suma_cm} cm"
-    
+    dispersion = None
+
+    if hoja is not None:
+        hoja_abs = hoja.astype(np.int64) + (x1, y1, x1, y1)
+        hoja_bbox = hoja_abs.tolist()
+        # La homografía de la sesión solo la actualiza detection_loop; si la hoja del
+        # ROI (p. ej. recortada) no coincide con la calibrada, se calcula una local
+        calibracion = session.calibracion
+        if not calibracion.vigente(hoja_abs):
+            calibracion = CalibracionHoja()
+            calibracion.actualizar(frame if session.ring.valida(seq) else None, hoja_abs)
+        dentro = postproceso.dentro_de(centros, hoja_abs)
+        celda_coords, medidas_texto, dispersion = calibracion.medir(centros[dentro], hoja_abs)
+
     return {
         "hoja": hoja_bbox,
-        "impactos": [{"bbox": list(bbox), "centro": list(centro)} for bbox, centro in impactos],
+        "impactos": [{"bbox": list(bbox), "centro": list(centro)} for bbox, centro in postproceso.como_lista(bboxes, centros)],
         "celda": celda_coords,
         "medidas": medidas_texto,
-    }
\ No newline at end of file
+        "dispersion": dispersion,
+    }
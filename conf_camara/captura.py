@@ -0,0 +1,197 @@
+import subprocess
+import threading
+import time
+import logging
+from collections import Counter
+import imageio_ffmpeg as ffmpeg_dl
+from .config import (RTSP_USER, RTSP_PASS, RTSP_PORT, RTSP_CHANNEL, RTSP_SUBTYPE, CAPTURE_STALL_TIMEOUT,
+                     CAPTURE_BACKOFF_MAX, CAPTURE_SOLO_KEYFRAMES, STREAM_MAX_FPS)
+from .frame_ring import leer_en
+from monitoreo.metricas import Contador, Histograma
+
+logger = logging.getLogger(__name__)
+
+FRAMES = Contador("camara_frames_total", "Frames recibidos de ffmpeg", ("stream",))
+FRAMES_DESCARTADOS = Contador("camara_frames_descartados_total", "Frames leídos y no publicados (pausa o incompletos)", ("stream",))
+REINICIOS = Contador("camara_reinicios_captura_total", "Reinicios del proceso ffmpeg", ("stream",))
+LECTURA_FRAME = Histograma("camara_lectura_frame_segundos",
+                           "Espera por cada frame del pipe de ffmpeg (decodificación + transporte)", ("stream",))
+
+
+def get_rtsp_url(ip: str, subtype: int = RTSP_SUBTYPE):
+    return f"rtsp://{RTSP_USER}:{RTSP_PASS}@{ip}:{RTSP_PORT}/cam/realmonitor?channel={RTSP_CHANNEL}&subtype={subtype}&transportmode=tcp"
+
+
+class CaptureSupervisor:
+    """
+    Mantiene vivo un proceso ffmpeg que escribe en un FrameRing. ffmpeg ya entrega
+    los frames a la tasa (filtro fps) y resolución que se consumen, así que no se
+    convierten ni se copian por el pipe frames que nadie usa. Si el stream termina
+    o deja de entregar frames por stall_timeout segundos, se reinicia ffmpeg con
+    espera exponencial (1, 2, 4... hasta backoff_max segundos).
+
+    fps es la tasa mínima (la que necesita la detección); cada visor MJPEG declara
+    la suya con demandar()/liberar_demanda() y la captura corre a la mayor de todas,
+    reiniciando ffmpeg sin espera cuando esa tasa cambia.
+    """
+
+    def __init__(self, ring, subtype: int, fps: float, nombre: str = "principal",
+                 stall_timeout: float = CAPTURE_STALL_TIMEOUT, backoff_max: float = CAPTURE_BACKOFF_MAX,
+                 solo_keyframes: bool = CAPTURE_SOLO_KEYFRAMES):
+        self.ring = ring
+        self.subtype = subtype
+        self.fps_minimo = fps
+        self.fps = fps
+        self._demandas = Counter()
+        self._reconfigurar = False
+        self.nombre = nombre
+        self.stall_timeout = stall_timeout
+        self.backoff_max = backoff_max
+        self.solo_keyframes = solo_keyframes
+        self.process = None
+        self._ultimo_dato = time.monotonic()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.descartados = 0
+        self.reinicios = 0
+        self.fps_decodificado = 0.0
+        self._ultimo_frame = None
+        self._m_frames = FRAMES.hijo(nombre)
+        self._m_descartados = FRAMES_DESCARTADOS.hijo(nombre)
+        self._m_reinicios = REINICIOS.hijo(nombre)
+        self._m_lectura = LECTURA_FRAME.hijo(nombre)
+
+    def comando(self, ip: str):
+        command = [ffmpeg_dl.get_ffmpeg_exe(), "-loglevel", "error", "-rtsp_transport", "tcp"]
+        if self.solo_keyframes:
+            # Solo decodifica frames clave: recorta el costo de decodificación H.264, no solo el de conversión
+            command += ["-skip_frame", "nokey"]
+        command += ["-i", get_rtsp_url(ip, self.subtype), "-an",
+                    "-vf", f"fps={self.fps},scale={self.ring.width}:{self.ring.height}",
+                    "-f", "image2pipe", "-pix_fmt", "bgr24", "-vcodec", "rawvideo", "-"]
+        return command
+
+    def ejecutar(self, session):
+        """Bucle de captura con reinicios; corre en el hilo de la sesión hasta que ésta se detiene."""
+        backoff = 1.0
+        while not session.detenido:
+            with self._lock:
+                if session.detenido:
+                    break
+                self.process = subprocess.Popen(self.comando(session.ip), stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL, bufsize=self.ring.frame_size)
+                self._ultimo_dato = time.monotonic()
+            recibidos = self._leer(session, self.process)
+            self.terminar()
+            if session.detenido:
+                break
+            with self._lock:
+                reconfigurar, self._reconfigurar = self._reconfigurar, False
+            if reconfigurar:
+                logger.info("Captura %s de %s a %s fps", self.nombre, session.ip, self.fps)
+                backoff = 1.0
+                continue
+            if recibidos:
+                backoff = 1.0
+            self.reinicios += 1
+            self._m_reinicios.inc()
+            logger.warning("Captura %s de %s interrumpida; reintentando en %.0f s", self.nombre, session.ip, backoff)
+            session.stop_event.wait(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _leer(self, session, process):
+        recibidos = 0
+        ring = self.ring
+        while not session.detenido:
+            inicio = time.perf_counter()
+            # ffmpeg escribe directo en el slot del ring, sin bytes intermedios
+            leidos = leer_en(process.stdout, ring.slot_escritura())
+            if leidos != ring.frame_size:
+                # EOF o frame incompleto: el proceso terminó (cámara caída o watchdog)
+                if leidos:
+                    self.descartados += 1
+                    self._m_descartados.inc()
+                return recibidos
+            self._m_lectura.observar(time.perf_counter() - inicio)
+            recibidos += 1
+            self._registrar_frame()
+            # En pausa el frame publicado queda congelado; se sigue drenando el pipe
+            if session.pause_detection:
+                self.descartados += 1
+                self._m_descartados.inc()
+            else:
+                ring.publicar()
+        return recibidos
+
+    def _registrar_frame(self):
+        ahora = time.monotonic()
+        self._ultimo_dato = ahora
+        self.frames += 1
+        self._m_frames.inc()
+        if self._ultimo_frame is not None and ahora > self._ultimo_frame:
+            instantaneo = 1.0 / (ahora - self._ultimo_frame)
+            self.fps_decodificado = instantaneo if not self.fps_decodificado else 0.9 * self.fps_decodificado + 0.1 * instantaneo
+        self._ultimo_frame = ahora
+
+    def demandar(self, fps: float):
+        """Un visor necesita frames a esta tasa (acotada a STREAM_MAX_FPS)."""
+        with self._lock:
+            self._demandas[min(fps, STREAM_MAX_FPS)] += 1
+            self._ajustar_fps()
+
+    def liberar_demanda(self, fps: float):
+        with self._lock:
+            fps = min(fps, STREAM_MAX_FPS)
+            self._demandas[fps] -= 1
+            if self._demandas[fps] <= 0:
+                del self._demandas[fps]
+            self._ajustar_fps()
+
+    def _ajustar_fps(self):
+        fps = max(self.fps_minimo, *self._demandas) if self._demandas else self.fps_minimo
+        if fps == self.fps:
+            return
+        self.fps = fps
+        if self.process is not None and self.process.poll() is None:
+            # ejecutar() relanza ffmpeg con la nueva tasa sin contarlo como falla
+            self._reconfigurar = True
+            self.process.terminate()
+
+    def vigilar(self):
+        """Mata ffmpeg si no entrega frames por stall_timeout; el bucle de ejecutar() lo reinicia."""
+        with self._lock:
+            process = self.process
+            if process is None or process.poll() is not None:
+                return
+            if time.monotonic() - self._ultimo_dato > self.stall_timeout:
+                logger.warning("Captura %s sin frames por %.0f s; reiniciando ffmpeg", self.nombre, self.stall_timeout)
+                process.kill()
+
+    def interrumpir(self):
+        """Corta el proceso actual desde otro hilo; ejecutar() se encarga de cerrarlo."""
+        with self._lock:
+            if self.process is not None:
+                self.process.terminate()
+
+    def terminar(self):
+        with self._lock:
+            process, self.process = self.process, None
+        if process is None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    def estadisticas(self):
+        return {
+            "subtype": self.subtype,
+            "fps_objetivo": self.fps,
+            "fps_decodificado": round(self.fps_decodificado, 2),
+            "frames": self.frames,
+            "frames_descartados": self.descartados,
+            "reinicios": self.reinicios,
+        }
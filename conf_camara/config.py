@@ -4,4 +4,55 @@ RTSP_PASS = "miguel003"
 RTSP_CHANNEL = 1
 RTSP_SUBTYPE = 0
 NETWORK_RANGE = "192.168.100.0/24"
-DETECTION_INTERVAL = 1
\ No newline at end of file
+DETECTION_INTERVAL = 1
+FRAME_RING_SLOTS = 8
+CAMERA_IDLE_TIMEOUT = 30
+INFERENCE_MAX_BATCH = 8
+INFERENCE_MAX_WAIT_MS = 25
+MODEL_WEIGHTS = "modelo/train100/best.pt"
+MODEL_IMGSZ = 640
+INFERENCE_ENGINE = "pytorch"  # "pytorch" | "onnx" | "onnx_int8" | "openvino"
+MODEL_CACHE_DIR = "modelo/cache"
+CALIBRATION_DIR = "modelo/calibracion"
+# Perfiles de video: nombre -> (ancho, alto, calidad JPEG)
+STREAM_PROFILES = {"full": (1280, 720, 90), "preview": (640, 360, 70)}
+STREAM_FPS = 1
+STREAM_MAX_FPS = 15
+# Seguimiento de impactos entre frames (px, ciclos de detección, IoU de la hoja)
+TRACKER_TOLERANCIA = 8
+TRACKER_MIN_HITS = 2
+TRACKER_MAX_MISSES = 3
+TRACKER_IOU_HOJA = 0.8
+# Inferencia solo ante cambios: tamaño de comparación, umbral por píxel (0-255),
+# píxeles cambiados mínimos y refresco forzado en segundos
+CAMBIO_TAMANO = (320, 180)
+CAMBIO_UMBRAL_PIXEL = 25
+CAMBIO_MIN_PIXELES = 3
+CAMBIO_REFRESCO_FORZADO = 10
+DETECCIONES_CACHE_MB = 8
+# Inferencia por tiles sobre la región de la hoja (impactos pequeños a distancia)
+TILES_ACTIVO = False
+TILE_TAMANO = 640
+TILE_SOLAPE = 64
+TILE_MARGEN_HOJA = 16
+TILES_PRESUPUESTO_MS = 800
+# Captura: ffmpeg decima (fps) y escala en origen; sub-stream opcional para el perfil preview.
+# CAPTURE_FPS es el mínimo para la detección; con visores conectados sube al fps del más rápido
+CAPTURE_FPS = 2
+CAPTURE_SUBTYPE_DETECCION = RTSP_SUBTYPE
+PREVIEW_SUBSTREAM = False
+CAPTURE_SUBTYPE_PREVIEW = 1
+CAPTURE_FPS_PREVIEW = 5
+CAPTURE_STALL_TIMEOUT = 10
+CAPTURE_BACKOFF_MAX = 30
+CAPTURE_SOLO_KEYFRAMES = False
+# Calibración de la hoja: homografía desde las esquinas reales (contorno) en lugar de la bbox
+CALIBRACION_REFINAR = True
+CALIBRACION_MARGEN = 12
+# Descubrimiento de cámaras: NETWORK_RANGE admite varias subredes separadas por coma
+CAMARAS_CONOCIDAS = "data/camaras_conocidas.json"
+DISCOVERY_CONCURRENCIA = 256
+DISCOVERY_TIMEOUT_CONEXION = 0.3
+DISCOVERY_TIMEOUT_RTSP = 1.0
+# Una cámara conocida que no responde en tantas búsquedas seguidas se olvida
+DISCOVERY_FALLOS_MAX = 3
@@ -0,0 +1,229 @@
+"""
+Motores de inferencia para el modelo de impactos.
+
+INFERENCE_ENGINE (config) elige cómo se ejecuta best.pt:
+  - "pytorch":   los pesos originales con ultralytics/torch.
+  - "onnx":      exportado a ONNX (dinámico en batch) y ejecutado con ONNX Runtime.
+  - "onnx_int8": el ONNX anterior cuantizado a INT8 con frames de calibración propios.
+  - "openvino":  exportado a OpenVINO IR.
+
+Los artefactos exportados se guardan en MODEL_CACHE_DIR/<hash de los pesos>/, así
+que la exportación ocurre una sola vez por versión de best.pt. onnxruntime y
+openvino son dependencias opcionales: solo se importan si se usa ese motor.
+
+Comparación de precisión/latencia entre motores:
+    python -m conf_camara.engine comparar --frames modelo/calibracion
+"""
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+from .config import MODEL_WEIGHTS, MODEL_IMGSZ, INFERENCE_ENGINE, MODEL_CACHE_DIR, CALIBRATION_DIR
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("pytorch", "onnx", "onnx_int8", "openvino")
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def hash_pesos(ruta: str) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+
+def listar_frames(directorio: str):
+    if not directorio or not os.path.isdir(directorio):
+        return []
+    return sorted(os.path.join(directorio, n) for n in os.listdir(directorio)
+                  if n.lower().endswith(EXTENSIONES_IMAGEN))
+
+
+def letterbox(imagen, imgsz: int):
+    """Mismo preprocesado que ultralytics: escala manteniendo aspecto y rellena con 114."""
+    h, w = imagen.shape[:2]
+    escala = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * escala)), int(round(w * escala))
+    lienzo = np.full((imgsz, imgsz, 3), 114, np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    lienzo[top:top + nh, left:left + nw] = cv2.resize(imagen, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return lienzo
+
+
+def _exportar_ultralytics(weights: str, formato: str, imgsz: int, destino: str):
+    from ultralytics import YOLO
+    exportado = YOLO(weights).export(format=formato, imgsz=imgsz, dynamic=True, verbose=False)
+    tmp = destino + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp) if os.path.isdir(tmp) else os.remove(tmp)
+    shutil.move(str(exportado), tmp)
+    os.replace(tmp, destino)
+    return destino
+
+
+def _cuantizar_int8(onnx_path: str, destino: str, imgsz: int, calibracion: str):
+    try:
+        import onnx
+        import onnxruntime
+        from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                              quantize_static)
+    except ImportError as e:
+        raise RuntimeError("El motor onnx_int8 requiere los paquetes onnx y onnxruntime") from e
+
+    frames = listar_frames(calibracion)
+    if not frames:
+        raise RuntimeError(f"No hay frames de calibración en {calibracion}")
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class LectorCalibracion(CalibrationDataReader):
+        def __init__(self):
+            self._rutas = iter(frames)
+
+        def get_next(self):
+            for ruta in self._rutas:
+                imagen = cv2.imread(ruta)
+                if imagen is None:
+                    continue
+                x = letterbox(imagen, imgsz)[:, :, ::-1].transpose(2, 0, 1)
+                return {input_name: np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0}
+            return None
+
+    tmp = destino + ".tmp"
+    quantize_static(onnx_path, tmp, LectorCalibracion(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    # ultralytics lee nombres de clases, stride e imgsz de los metadatos del ONNX
+    original, cuantizado = onnx.load(onnx_path), onnx.load(tmp)
+    del cuantizado.metadata_props[:]
+    cuantizado.metadata_props.extend(original.metadata_props)
+    onnx.save(cuantizado, tmp)
+    os.replace(tmp, destino)
+    return destino
+
+
+def exportar(engine: str = INFERENCE_ENGINE, weights: str = MODEL_WEIGHTS, imgsz: int = MODEL_IMGSZ,
+             calibracion: str = CALIBRATION_DIR) -> str:
+    """Devuelve la ruta del artefacto para el motor, exportándolo solo si no está en caché."""
+    if engine not in ENGINES:
+        raise ValueError(f"Motor de inferencia desconocido: {engine}")
+    if engine == "pytorch":
+        return weights
+    cache = os.path.join(MODEL_CACHE_DIR, hash_pesos(weights))
+    os.makedirs(cache, exist_ok=True)
+    nombre = os.path.splitext(os.path.basename(weights))[0]
+    onnx_path = os.path.join(cache, f"{nombre}_{imgsz}.onnx")
+    if engine == "openvino":
+        destino = os.path.join(cache, f"{nombre}_{imgsz}_openvino_model")
+        if not os.path.isdir(destino):
+            logger.info("Exportando %s a OpenVINO en %s", weights, destino)
+            _exportar_ultralytics(weights, "openvino", imgsz, destino)
+        return destino
+    if not os.path.isfile(onnx_path):
+        logger.info("Exportando %s a ONNX en %s", weights, onnx_path)
+        _exportar_ultralytics(weights, "onnx", imgsz, onnx_path)
+    if engine == "onnx":
+        return onnx_path
+    int8_path = os.path.join(cache, f"{nombre}_{imgsz}_int8.onnx")
+    if not os.path.isfile(int8_path):
+        logger.info("Cuantizando %s a INT8 con frames de %s", onnx_path, calibracion)
+        _cuantizar_int8(onnx_path, int8_path, imgsz, calibracion)
+    return int8_path
+
+
+def warmup(model, imgsz: int = MODEL_IMGSZ, repeticiones: int = 2):
+    """Primeras pasadas en vacío para que la primera detección real no pague la inicialización."""
+    frame = np.zeros((720, 1280, 3), np.uint8)
+    for _ in range(repeticiones):
+        model(frame, imgsz=imgsz, conf=0.5, verbose=False)
+
+
+def cargar_modelo(engine: str = INFERENCE_ENGINE, weights: str = MODEL_WEIGHTS, imgsz: int = MODEL_IMGSZ):
+    from ultralytics import YOLO
+    ruta = exportar(engine, weights, imgsz)
+    model = YOLO(ruta, task="detect")
+    inicio = time.perf_counter()
+    warmup(model, imgsz)
+    logger.info("Modelo %s (%s) listo; warmup en %.0f ms", ruta, engine, (time.perf_counter() - inicio) * 1000)
+    return model
+
+
+def _detecciones(model, imagen, imgsz):
+    r = model(imagen, imgsz=imgsz, conf=0.5, verbose=False)[0]
+    data = r.boxes.data.cpu().numpy() if len(r.boxes) else np.zeros((0, 6), np.float32)
+    return data, r.names
+
+
+def _iou(a, b):
+    x1, y1 = np.maximum(a[:, None, 0], b[None, :, 0]), np.maximum(a[:, None, 1], b[None, :, 1])
+    x2, y2 = np.minimum(a[:, None, 2], b[None, :, 2]), np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _coincidencias(ref, otra, iou_min=0.5):
+    """Cantidad de detecciones de ref con una detección de la misma clase en otra (IoU >= iou_min)."""
+    total = 0
+    for cls in np.unique(ref[:, 5]):
+        a, b = ref[ref[:, 5] == cls, :4], otra[otra[:, 5] == cls, :4]
+        if len(b):
+            total += int((_iou(a, b).max(axis=1) >= iou_min).sum())
+    return total
+
+
+def comparar(frames, engines=ENGINES, imgsz: int = MODEL_IMGSZ):
+    """Latencia por frame de cada motor y concordancia de hoja/impacto contra pytorch."""
+    imagenes = [img for img in (cv2.imread(r) for r in frames) if img is not None]
+    if not imagenes:
+        raise RuntimeError("No hay frames para comparar")
+    referencia = None
+    filas = []
+    for engine in ("pytorch",) + tuple(e for e in engines if e != "pytorch"):
+        model = cargar_modelo(engine, imgsz=imgsz)
+        detecciones, tiempos = [], []
+        for imagen in imagenes:
+            inicio = time.perf_counter()
+            data, names = _detecciones(model, imagen, imgsz)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            detecciones.append(data)
+        fila = {"motor": engine, "ms_medio": float(np.mean(tiempos)), "ms_p95": float(np.percentile(tiempos, 95))}
+        if referencia is None:
+            referencia = detecciones
+        for cls_id, nombre in names.items():
+            if nombre not in ("hoja", "impacto"):
+                continue
+            ref_n = sum(int((d[:, 5] == cls_id).sum()) for d in referencia)
+            n = sum(int((d[:, 5] == cls_id).sum()) for d in detecciones)
+            match = sum(_coincidencias(r[r[:, 5] == cls_id], d[d[:, 5] == cls_id])
+                        for r, d in zip(referencia, detecciones))
+            fila[nombre] = f"{match}/{ref_n} (detectadas {n})"
+        filas.append(fila)
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta y compara motores de inferencia del modelo de impactos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    exp = sub.add_parser("exportar", help="Exporta (o reutiliza de caché) el artefacto de un motor")
+    exp.add_argument("--engine", default=INFERENCE_ENGINE, choices=ENGINES)
+    cmp_ = sub.add_parser("comparar", help="Compara latencia y detecciones de varios motores contra pytorch")
+    cmp_.add_argument("--frames", default=CALIBRATION_DIR)
+    cmp_.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.comando == "exportar":
+        print(exportar(args.engine))
+        return
+    for fila in comparar(listar_frames(args.frames), tuple(args.engines)):
+        print(f"{fila['motor']:>10}  medio {fila['ms_medio']:7.1f} ms  p95 {fila['ms_p95']:7.1f} ms  "
+              f"hoja {fila.get('hoja', '-')}  impacto {fila.get('impacto', '-')}")
+
+
+if __name__ == "__main__":
+    main()
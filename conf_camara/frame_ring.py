@@ -0,0 +1,80 @@
+import threading
+import numpy as np
+
+
+class FrameRing:
+    """
+    Buffer circular preasignado de N frames BGR con números de secuencia.
+
+    Un único escritor (el lector de ffmpeg) llena el siguiente slot directamente
+    desde el pipe con readinto y lo publica; los lectores reciben una vista de solo
+    lectura del slot (sin copiar) junto con su secuencia. Como el slot se reutiliza
+    N frames después, quien necesite el frame por más tiempo debe verificar con
+    valida(seq) al terminar, o copiar lo que use.
+    """
+
+    def __init__(self, width: int, height: int, slots: int = 8):
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.slots = slots
+        self._buf = np.empty((slots, height, width, 3), np.uint8)
+        self._vistas = []
+        for i in range(slots):
+            vista = self._buf[i].view()
+            vista.flags.writeable = False
+            self._vistas.append(vista)
+        # Secuencia almacenada en cada slot (0 = vacío o escribiéndose)
+        self._seqs = [0] * slots
+        self.seq = 0
+        self._cerrado = False
+        # Solo se usa para despertar a los lectores bloqueados, no para proteger los datos
+        self._cond = threading.Condition()
+
+    def slot_escritura(self):
+        """Memoryview escribible del próximo slot; lo invalida hasta que se publique."""
+        idx = (self.seq + 1) % self.slots
+        self._seqs[idx] = 0
+        return memoryview(self._buf[idx].reshape(-1))
+
+    def publicar(self):
+        """Publica el slot devuelto por slot_escritura() como el frame más reciente."""
+        seq = self.seq + 1
+        self._seqs[seq % self.slots] = seq
+        self.seq = seq
+        with self._cond:
+            self._cond.notify_all()
+
+    def valida(self, seq: int) -> bool:
+        """True si el slot de seq todavía no fue sobrescrito."""
+        return seq > 0 and self._seqs[seq % self.slots] == seq
+
+    def ultimo(self):
+        """Devuelve (seq, vista) del frame más reciente, o (0, None) si aún no hay frames."""
+        seq = self.seq
+        if seq == 0 or self._cerrado:
+            return 0, None
+        return seq, self._vistas[seq % self.slots]
+
+    def esperar(self, despues_de: int, timeout: float = None):
+        """Bloquea hasta que haya un frame con secuencia mayor a despues_de."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > despues_de or self._cerrado, timeout=timeout)
+        return self.ultimo()
+
+    def cerrar(self):
+        self._cerrado = True
+        with self._cond:
+            self._cond.notify_all()
+
+
+def leer_en(stream, destino: memoryview) -> int:
+    """Llena destino con readinto desde stream; devuelve los bytes leídos (menos = EOF)."""
+    total = 0
+    size = len(destino)
+    while total < size:
+        n = stream.readinto(destino[total:])
+        if not n:
+            break
+        total += n
+    return total
@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+from monitoreo.metricas import Contador, Histograma
+
+logger = logging.getLogger(__name__)
+
+IMAGENES = Contador("inferencia_imagenes_total", "Imágenes inferidas (su tasa es el fps de inferencia)")
+LOTES = Histograma("inferencia_lote_tamano", "Imágenes por pasada del modelo", limites=(1, 2, 4, 8, 16, 32))
+DURACION = Histograma("inferencia_segundos", "Duración de cada pasada del modelo")
+ESPERA = Histograma("inferencia_espera_cola_segundos", "Espera en cola de la imagen más antigua de cada lote")
+
+
+class _Pedido:
+    __slots__ = ("imagen", "future", "encolado")
+
+    def __init__(self, imagen):
+        self.imagen = imagen
+        self.future = Future()
+        self.encolado = time.monotonic()
+
+
+class InferenceScheduler:
+    """
+    Junta las imágenes pendientes de todas las cámaras y ROIs en un solo lote
+    (hasta max_batch imágenes o max_wait_ms desde la primera) y hace una única
+    pasada del modelo; cada llamador recibe su propio resultado.
+
+    predict recibe una lista de imágenes y devuelve una lista de resultados en el
+    mismo orden. Si la pasada del lote falla, cada imagen se reintenta sola para
+    que el error llegue solo al pedido que lo causó.
+    """
+
+    def __init__(self, predict, max_batch: int = 8, max_wait_ms: float = 25, historial: int = 200):
+        self.predict = predict
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._cola = queue.Queue()
+        self._lotes = deque(maxlen=historial)
+        self._stats_lock = threading.Lock()
+        self._total_lotes = 0
+        self._total_imagenes = 0
+        self._hilo = None
+        self._hilo_lock = threading.Lock()
+
+    def submit(self, imagen) -> Future:
+        self._iniciar()
+        pedido = _Pedido(imagen)
+        self._cola.put(pedido)
+        return pedido.future
+
+    def inferir(self, imagen, timeout: float = None):
+        """Encola la imagen y espera su resultado."""
+        return self.submit(imagen).result(timeout=timeout)
+
+    def _iniciar(self):
+        if self._hilo is not None:
+            return
+        with self._hilo_lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="inference-scheduler")
+                self._hilo.start()
+
+    def _armar_lote(self):
+        primero = self._cola.get()
+        lote = [primero]
+        limite = primero.encolado + self.max_wait
+        while len(lote) < self.max_batch:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while True:
+            # Los pedidos cancelados mientras esperaban en cola no se infieren
+            lote = [p for p in self._armar_lote() if p.future.set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            inicio = time.monotonic()
+            try:
+                resultados = self.predict([p.imagen for p in lote])
+            except Exception as e:
+                logger.error("Error en inferencia por lotes de %d imágenes: %s", len(lote), e)
+                self._por_separado(lote)
+                continue
+            fin = time.monotonic()
+            for p, r in zip(lote, resultados):
+                p.future.set_result(r)
+            self._registrar(lote, inicio, fin)
+
+    def _por_separado(self, lote):
+        for p in lote:
+            inicio = time.monotonic()
+            try:
+                resultado = self.predict([p.imagen])[0]
+            except Exception as e:
+                p.future.set_exception(e)
+                continue
+            p.future.set_result(resultado)
+            self._registrar([p], inicio, time.monotonic())
+
+    def en_cola(self):
+        return self._cola.qsize()
+
+    def _registrar(self, lote, inicio, fin):
+        IMAGENES.inc(len(lote))
+        LOTES.observar(len(lote))
+        DURACION.observar(fin - inicio)
+        ESPERA.observar(inicio - lote[0].encolado)
+        esperas = [(inicio - p.encolado) * 1000 for p in lote]
+        registro = {
+            "tamano": len(lote),
+            "espera_max_ms": round(max(esperas), 2),
+            "espera_media_ms": round(sum(esperas) / len(esperas), 2),
+            "inferencia_ms": round((fin - inicio) * 1000, 2),
+        }
+        with self._stats_lock:
+            self._lotes.append(registro)
+            self._total_lotes += 1
+            self._total_imagenes += len(lote)
+        logger.debug("Lote de inferencia: %s", registro)
+
+    def estadisticas(self):
+        with self._stats_lock:
+            lotes = list(self._lotes)
+            total_lotes, total_imagenes = self._total_lotes, self._total_imagenes
+        resumen = {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "en_cola": self._cola.qsize(),
+            "total_lotes": total_lotes,
+            "total_imagenes": total_imagenes,
+            "ultimos_lotes": lotes[-20:],
+        }
+        if lotes:
+            resumen["tamano_medio"] = round(sum(l["tamano"] for l in lotes) / len(lotes), 2)
+            resumen["espera_media_ms"] = round(sum(l["espera_media_ms"] for l in lotes) / len(lotes), 2)
+            resumen["inferencia_media_ms"] = round(sum(l["inferencia_ms"] for l in lotes) / len(lotes), 2)
+        return resumen
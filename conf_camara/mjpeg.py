@@ -0,0 +1,79 @@
+import threading
+import time
+import cv2
+from .config import STREAM_PROFILES
+from monitoreo.metricas import Contador, Histograma
+
+CODIFICACION = Histograma("mjpeg_codificacion_segundos", "Resize + cv2.imencode de un frame", ("perfil",))
+FRAMES_ENVIADOS = Contador("mjpeg_frames_enviados_total", "Frames enviados a visores", ("perfil",))
+
+
+class MjpegEncoder:
+    """
+    Codifica cada frame del ring una sola vez por perfil (resolución + calidad) y
+    comparte el JPEG entre todos los visores de ese perfil. Solo se codifican los
+    perfiles que algún visor pidió, y a lo sumo una vez por número de secuencia.
+    """
+
+    def __init__(self, ring, rings_perfil=None, perfiles=STREAM_PROFILES):
+        self.ring = ring
+        # Perfiles con su propia captura (p. ej. sub-stream de la cámara para preview)
+        self.rings_perfil = rings_perfil or {}
+        self.perfiles = perfiles
+        self._cache = {}
+        self._locks = {perfil: threading.Lock() for perfil in perfiles}
+        self._m_codificacion = {perfil: CODIFICACION.hijo(perfil) for perfil in perfiles}
+
+    def ring_de(self, perfil: str):
+        return self.rings_perfil.get(perfil, self.ring)
+
+    def jpeg(self, perfil: str):
+        """(seq, jpeg) del frame más reciente en el perfil pedido, o (0, None) si no hay."""
+        ring = self.ring_de(perfil)
+        seq, frame = ring.ultimo()
+        if frame is None:
+            return 0, None
+        with self._locks[perfil]:
+            cacheado = self._cache.get(perfil)
+            if cacheado is not None and cacheado[0] >= seq:
+                return cacheado
+            inicio = time.perf_counter()
+            ancho, alto, calidad = self.perfiles[perfil]
+            if (frame.shape[1], frame.shape[0]) != (ancho, alto):
+                frame = cv2.resize(frame, (ancho, alto), interpolation=cv2.INTER_AREA)
+            success, buffer = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), calidad])
+            self._m_codificacion[perfil].observar(time.perf_counter() - inicio)
+            # Si el ring reutilizó el slot mientras lo leíamos, el JPEG no es confiable
+            if not success or not ring.valida(seq):
+                return cacheado if cacheado is not None else (0, None)
+            self._cache[perfil] = (seq, buffer.tobytes())
+            return self._cache[perfil]
+
+
+def stream_mjpeg(session, perfil: str, fps: float):
+    """
+    Generador multipart para un visor. Cada iteración toma el frame más reciente,
+    así que un cliente lento descarta los frames viejos en lugar de encolarlos; el
+    ritmo lo fija fps, independiente del intervalo de detección. Mientras el visor
+    está conectado la captura corre al menos a fps.
+    """
+    intervalo = 1.0 / fps
+    ring = session.encoder.ring_de(perfil)
+    captura = session.captura_de(perfil)
+    enviados = FRAMES_ENVIADOS.hijo(perfil)
+    seq = 0
+    captura.demandar(fps)
+    try:
+        while not session.detenido:
+            inicio = time.monotonic()
+            ring.esperar(seq, timeout=5.0)
+            seq_nuevo, jpeg = session.encoder.jpeg(perfil)
+            if jpeg is not None and seq_nuevo > seq:
+                seq = seq_nuevo
+                enviados.inc()
+                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+            restante = intervalo - (time.monotonic() - inicio)
+            if restante > 0:
+                session.stop_event.wait(restante)
+    finally:
+        captura.liberar_demanda(fps)
@@ -0,0 +1,71 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModeloNoDisponible(Exception):
+    pass
+
+
+class ModelRegistry:
+    """
+    Carga el modelo configurado una sola vez, en segundo plano, para que la API
+    responda mientras tanto. obtener() devuelve el modelo si está listo y, si no,
+    lanza ModeloNoDisponible (o espera hasta timeout si se indica).
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._model = None
+        # Se incrementa con cada carga; sirve para invalidar resultados cacheados
+        self.version = 0
+        self._estado = "sin_cargar"
+        self._error = None
+        self._segundos_carga = None
+        self._listo = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def listo(self):
+        return self._listo.is_set()
+
+    def iniciar_warmup(self):
+        """Lanza la carga + warmup en un hilo; llamadas repetidas no cargan dos veces."""
+        with self._lock:
+            if self._estado in ("calentando", "listo"):
+                return
+            self._estado = "calentando"
+            self._error = None
+        threading.Thread(target=self._cargar, daemon=True, name="model-warmup").start()
+
+    def _cargar(self):
+        inicio = time.monotonic()
+        try:
+            model = self.loader()
+        except Exception as e:
+            logger.error("No se pudo cargar el modelo YOLO: %s", e)
+            with self._lock:
+                self._estado = "error"
+                self._error = str(e)
+            return
+        with self._lock:
+            self._model = model
+            self.version += 1
+            self._estado = "listo"
+            self._segundos_carga = round(time.monotonic() - inicio, 2)
+        self._listo.set()
+        logger.info("Modelo YOLO cargado correctamente en %.2f s", self._segundos_carga)
+
+    def obtener(self, timeout: float = None):
+        if not self.listo:
+            self.iniciar_warmup()
+            if not timeout or not self._listo.wait(timeout):
+                raise ModeloNoDisponible(self._estado)
+        return self._model
+
+    def estado(self):
+        with self._lock:
+            return {"estado": self._estado, "error": self._error, "segundos_carga": self._segundos_carga,
+                    "version": self.version}
@@ -1,21 +1,156 @@
-import socket
+import os
+import json
+import time
+import asyncio
 import ipaddress
-import concurrent.futures
-from .config import NETWORK_RANGE, RTSP_PORT
+import logging
+from contextlib import aclosing
+from .config import (NETWORK_RANGE, RTSP_PORT, CAMARAS_CONOCIDAS, DISCOVERY_CONCURRENCIA,
+                     DISCOVERY_TIMEOUT_CONEXION, DISCOVERY_TIMEOUT_RTSP, DISCOVERY_FALLOS_MAX)
 
-def is_port_open(ip, port=RTSP_PORT):
+logger = logging.getLogger(__name__)
+
+def redes(rango=NETWORK_RANGE):
+    """Subredes a escanear: una o varias separadas por coma."""
+    return [ipaddress.ip_network(r.strip(), strict=False) for r in rango.split(",") if r.strip()]
+
+async def verificar_rtsp(ip: str, port: int = RTSP_PORT, timeout_conexion: float = DISCOVERY_TIMEOUT_CONEXION,
+                         timeout_rtsp: float = DISCOVERY_TIMEOUT_RTSP):
+    """
+    Confirma que en ip:port responde un servidor RTSP (no solo un puerto abierto):
+    envía OPTIONS y espera una línea de estado RTSP/1.0. Un 401 también cuenta,
+    las cámaras piden autenticación. Devuelve un dict con los datos o None.
+    """
     try:
-        with socket.create_connection((ip, port), timeout=2):  # aumentar timeout
-            return ip
-    except:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout_conexion)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(f"OPTIONS rtsp://{ip}:{port}/ RTSP/1.0\r\nCSeq: 1\r\nUser-Agent: precision\r\n\r\n".encode())
+        await writer.drain()
+        respuesta = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout_rtsp)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return None
+    finally:
+        writer.close()
+    lineas = respuesta.decode("latin-1").split("\r\n")
+    partes = lineas[0].split(" ", 2)
+    if len(partes) < 2 or partes[0] != "RTSP/1.0":
         return None
+    cabeceras = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lineas[1:] if ":" in l)}
+    return {"ip": ip, "puerto": port, "estado": int(partes[1]) if partes[1].isdigit() else None,
+            "servidor": cabeceras.get("server")}
+
+def cargar_conocidas(ruta: str = CAMARAS_CONOCIDAS):
+    try:
+        with open(ruta) as f:
+            return json.load(f).get("camaras", [])
+    except (OSError, ValueError):
+        return []
+
+def guardar_conocidas(camaras, ruta: str = CAMARAS_CONOCIDAS, fallidas=(), fallos_max: int = DISCOVERY_FALLOS_MAX):
+    """
+    Agrega las cámaras encontradas a la lista persistida (la más reciente primero).
+    Las conocidas que se verificaron y no respondieron (fallidas, pares (ip, puerto))
+    suman un fallo; con fallos_max fallos seguidos se quitan de la lista.
+    """
+    ahora = time.time()
+    nuevas = [{"ip": c["ip"], "puerto": c["puerto"], "visto": ahora, "fallos": 0} for c in camaras]
+    vistas = {(c["ip"], c["puerto"]) for c in nuevas}
+    fallidas = set(fallidas)
+    conocidas = list(nuevas)
+    for c in cargar_conocidas(ruta):
+        clave = (c["ip"], c["puerto"])
+        if clave in vistas:
+            continue
+        if clave in fallidas:
+            c = dict(c, fallos=c.get("fallos", 0) + 1)
+            if c["fallos"] >= fallos_max:
+                logger.info("Se olvida la cámara %s:%s tras %d búsquedas sin respuesta", *clave, c["fallos"])
+                continue
+        conocidas.append(c)
+    try:
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        temporal = ruta + ".tmp"
+        with open(temporal, "w") as f:
+            json.dump({"camaras": conocidas}, f)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning("No se pudo guardar la lista de cámaras conocidas: %s", e)
+
+async def _escanear(objetivos, concurrencia: int, timeout_conexion: float, timeout_rtsp: float, fallidas=None):
+    """
+    Verifica (ip, puerto) con a lo sumo concurrencia conexiones a la vez; entrega cada
+    cámara al encontrarla. Si se pasa el set fallidas, agrega los que no respondieron.
+    """
+    objetivos = iter(objetivos)
+    resultados = asyncio.Queue()
+
+    async def trabajador():
+        # El iterador es compartido: cada trabajador toma el siguiente host libre
+        for ip, port in objetivos:
+            camara = await verificar_rtsp(ip, port, timeout_conexion, timeout_rtsp)
+            if camara is not None:
+                await resultados.put(camara)
+            elif fallidas is not None:
+                fallidas.add((ip, port))
+
+    async def todos():
+        try:
+            await asyncio.gather(*(trabajador() for _ in range(max(1, concurrencia))))
+        finally:
+            await resultados.put(None)
+
+    tarea = asyncio.create_task(todos())
+    try:
+        while True:
+            camara = await resultados.get()
+            if camara is None:
+                break
+            yield camara
+    finally:
+        tarea.cancel()
+
+async def descubrir(rango: str = NETWORK_RANGE, port: int = RTSP_PORT, completo: bool = False,
+                    concurrencia: int = DISCOVERY_CONCURRENCIA, timeout_conexion: float = DISCOVERY_TIMEOUT_CONEXION,
+                    timeout_rtsp: float = DISCOVERY_TIMEOUT_RTSP, ruta_conocidas: str = CAMARAS_CONOCIDAS):
+    """
+    Generador asíncrono de cámaras RTSP. Primero verifica las cámaras conocidas
+    (persistidas de búsquedas anteriores); si alguna responde y no se pidió una
+    búsqueda completa, termina ahí. Si no, recorre las subredes de rango.
+    """
+    encontradas = []
+    vistos = set()
+    # Solo cuentan como fallo las conocidas efectivamente verificadas (la búsqueda puede cortarse antes)
+    fallidas = set()
+    try:
+        conocidas = [(c["ip"], c.get("puerto", port)) for c in cargar_conocidas(ruta_conocidas)]
+        async with aclosing(_escanear(conocidas, concurrencia, timeout_conexion, timeout_rtsp, fallidas)) as camaras:
+            async for camara in camaras:
+                camara["conocida"] = True
+                encontradas.append(camara)
+                vistos.add(camara["ip"])
+                yield camara
+        if encontradas and not completo:
+            return
+        hosts = ((str(ip), port) for red in redes(rango) for ip in red.hosts() if str(ip) not in vistos)
+        async with aclosing(_escanear(hosts, concurrencia, timeout_conexion, timeout_rtsp)) as camaras:
+            async for camara in camaras:
+                camara["conocida"] = False
+                encontradas.append(camara)
+                yield camara
+    finally:
+        if encontradas or fallidas:
+            guardar_conocidas(encontradas, ruta_conocidas, fallidas)
+
+async def buscar_camaras(**kwargs):
+    return [camara async for camara in descubrir(**kwargs)]
 
 def scan_for_camera_ip(base_ip=NETWORK_RANGE, port=RTSP_PORT):
-    net = ipaddress.ip_network(base_ip, strict=False)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=200) as executor:  # más hilos
-        futures = {executor.submit(is_port_open, str(ip), port): ip for ip in net.hosts()}
-        for future in concurrent.futures.as_completed(futures):
-            ip = future.result()
-            if ip:
-                return str(ip)
-    return None
+    """Compatibilidad: IP de la primera cámara encontrada, o None."""
+    async def primera():
+        async with aclosing(descubrir(base_ip, port)) as camaras:
+            async for camara in camaras:
+                return camara["ip"]
+        return None
+    return asyncio.run(primera())
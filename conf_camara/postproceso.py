@@ -0,0 +1,96 @@
+"""
+Post-procesado vectorizado de las detecciones del modelo.
+
+Trabaja sobre el arreglo completo boxes.data (N x 6: x1, y1, x2, y2, conf, cls)
+con NumPy en lugar de recorrer r.boxes caja por caja. Las coordenadas se truncan
+a enteros igual que el int() original y los centros usan división entera, así
+que los resultados JSON son idénticos a los de la versión por caja.
+"""
+import numpy as np
+
+HOJA_ANCHO_CM = 21.59
+HOJA_ALTO_CM = 27.94
+
+_VACIO = np.zeros((0, 6), np.float32)
+
+
+def detecciones_array(result):
+    """boxes.data de un resultado de ultralytics como arreglo NumPy (N x 6)."""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return _VACIO
+    data = boxes.data
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+
+def id_clase(names, nombre: str) -> int:
+    for cls, n in names.items():
+        if n == nombre:
+            return cls
+    return -1
+
+
+def separar(data, names):
+    """
+    Devuelve (hoja, impactos): hoja son las coordenadas float de la hoja con mayor
+    confianza (o None) e impactos un arreglo entero (M x 4) con las cajas truncadas.
+    """
+    cls = data[:, 5].astype(np.int64)
+    hojas = data[cls == id_clase(names, "hoja")]
+    hoja = hojas[int(np.argmax(hojas[:, 4])), :4] if len(hojas) else None
+    impactos = data[cls == id_clase(names, "impacto"), :4].astype(np.int64)
+    return hoja, impactos
+
+
+def iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centros(bboxes):
+    return (bboxes[:, 0:2] + bboxes[:, 2:4]) // 2
+
+
+def dentro_de(centros_, hoja_int):
+    """Máscara de centros dentro de la hoja (bordes incluidos)."""
+    hx1, hy1, hx2, hy2 = hoja_int
+    x, y = centros_[:, 0], centros_[:, 1]
+    return (hx1 <= x) & (x <= hx2) & (hy1 <= y) & (y <= hy2)
+
+
+def celda_y_medidas(centros_dentro, hoja_int):
+    """Celda (min/max de los centros) y texto de medidas en cm; (None, "") si no hay impactos."""
+    if len(centros_dentro) == 0:
+        return None, ""
+    x1_celda, y1_celda = centros_dentro.min(axis=0).tolist()
+    x2_celda, y2_celda = centros_dentro.max(axis=0).tolist()
+    hx1, hy1, hx2, hy2 = (int(v) for v in hoja_int)
+    ratio_x = HOJA_ANCHO_CM / (hx2 - hx1)
+    ratio_y = HOJA_ALTO_CM / (hy2 - hy1)
+    medidas = texto_medidas((x2_celda - x1_celda) * ratio_x, (y2_celda - y1_celda) * ratio_y)
+    return (x1_celda, y1_celda, x2_celda, y2_celda), medidas
+
+
+def texto_medidas(ancho_cm, alto_cm):
+    ancho_cm = round(ancho_cm, 2)
+    alto_cm = round(alto_cm, 2)
+    suma_cm = round(ancho_cm + alto_cm, 2)
+    return f"Ancho: {ancho_cm} cm  Alto: {alto_cm} cm  Suma: {suma_cm} cm"
+
+
+def como_lista(bboxes, centros_):
+    """Formato de salida: [((x1, y1, x2, y2), (cx, cy)), ...] con enteros de Python."""
+    return [(tuple(b), tuple(c)) for b, c in zip(bboxes.tolist(), centros_.tolist())]
+
+
+def impactos_manuales(impactos_manual):
+    """Cajas y centros de impactos manuales con la misma aritmética que el cálculo original."""
+    if not impactos_manual:
+        return np.zeros((0, 4), np.int64), np.zeros((0, 2), np.int64)
+    m = np.asarray([imp['bbox'] for imp in impactos_manual], dtype=np.float64)
+    c = (m[:, 0:2] + m[:, 2:4]) // 2
+    return m.astype(np.int64), c.astype(np.int64)
+
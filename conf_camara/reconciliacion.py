@@ -0,0 +1,51 @@
+"""
+Índice espacial para reconciliar detecciones con impactos eliminados o agregados
+a mano. Reemplaza la comparación todos-contra-todos de impactos_se_solapan por
+una grilla hash con celdas del tamaño de la tolerancia: un punto a distancia
+menor que la tolerancia siempre cae en la misma celda o en una vecina, así que
+cada consulta solo revisa 9 celdas.
+"""
+import math
+import numpy as np
+
+TOLERANCIA_IMPACTO = 10
+
+
+def _centro(bbox):
+    x1, y1, x2, y2 = bbox
+    return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+class IndiceImpactos:
+    """
+    Centros de un conjunto de bboxes agrupados en una grilla. cerca() responde lo
+    mismo que any(impactos_se_solapan(bbox, otro, tolerancia) for otro in bboxes):
+    misma fórmula de centros y misma distancia euclídea con < estricto.
+    """
+
+    def __init__(self, bboxes, tolerancia=TOLERANCIA_IMPACTO):
+        self.tolerancia = tolerancia
+        self._celdas = {}
+        for bbox in bboxes:
+            cx, cy = _centro(bbox)
+            self._celdas.setdefault(self._celda(cx, cy), []).append((cx, cy))
+
+    def __len__(self):
+        return sum(len(v) for v in self._celdas.values())
+
+    def _celda(self, cx, cy):
+        return math.floor(cx / self.tolerancia), math.floor(cy / self.tolerancia)
+
+    def cerca(self, bbox) -> bool:
+        cx1, cy1 = _centro(bbox)
+        i, j = self._celda(cx1, cy1)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for cx2, cy2 in self._celdas.get((i + di, j + dj), ()):
+                    if ((cx1 - cx2)**2 + (cy1 - cy2)**2)**0.5 < self.tolerancia:
+                        return True
+        return False
+
+    def mascara(self, bboxes):
+        """Arreglo booleano: True para cada bbox que coincide con alguno del índice."""
+        return np.fromiter((self.cerca(b) for b in bboxes), bool, count=len(bboxes))
@@ -0,0 +1,188 @@
+import threading
+import time
+import logging
+from .config import (FRAME_RING_SLOTS, CAMERA_IDLE_TIMEOUT, STREAM_PROFILES, CAPTURE_FPS, CAPTURE_SUBTYPE_DETECCION,
+                     PREVIEW_SUBSTREAM, CAPTURE_SUBTYPE_PREVIEW, CAPTURE_FPS_PREVIEW)
+from .frame_ring import FrameRing
+from .mjpeg import MjpegEncoder
+from .captura import CaptureSupervisor
+from .tracker import ImpactTracker
+from .cambio import DetectorCambio
+from .calibracion import CalibracionHoja
+
+logger = logging.getLogger(__name__)
+
+FRAME_WIDTH, FRAME_HEIGHT = 1280, 720
+
+SNAPSHOT_VACIO = {"version": 0, "hoja": None, "impactos": [], "celda": None, "medidas": "", "dispersion": None, "hits": []}
+
+
+class CameraSession:
+    """
+    Estado de una cámara: supervisores de captura ffmpeg, rings de frames, hilos de captura y
+    detección, encoder MJPEG compartido, último snapshot publicado y pausa; nada
+    de esto es global al módulo.
+    """
+
+    def __init__(self, camera_id: str, ip: str):
+        self.camera_id = camera_id
+        self.ip = ip
+        self.stop_event = threading.Event()
+        self.pause_detection = False
+        self.ring = FrameRing(FRAME_WIDTH, FRAME_HEIGHT, FRAME_RING_SLOTS)
+        self.captura = CaptureSupervisor(self.ring, CAPTURE_SUBTYPE_DETECCION, CAPTURE_FPS, "principal")
+        self.captura_preview = None
+        rings_perfil = {}
+        if PREVIEW_SUBSTREAM:
+            # El perfil preview sale del sub-stream de la cámara, no de reducir el principal
+            ancho, alto, _ = STREAM_PROFILES["preview"]
+            rings_perfil["preview"] = FrameRing(ancho, alto, FRAME_RING_SLOTS)
+            self.captura_preview = CaptureSupervisor(rings_perfil["preview"], CAPTURE_SUBTYPE_PREVIEW,
+                                                     CAPTURE_FPS_PREVIEW, "preview")
+        self.capturas = [c for c in (self.captura, self.captura_preview) if c is not None]
+        self.encoder = MjpegEncoder(self.ring, rings_perfil)
+        # Publicación de detecciones: cada ciclo incrementa la versión y notifica
+        self.cond = threading.Condition()
+        self.version = 0
+        self.snapshot = dict(SNAPSHOT_VACIO)
+        self.calibracion = CalibracionHoja()
+        self.tracker = ImpactTracker(calibracion=self.calibracion)
+        self.cambio = DetectorCambio()
+        # Última salida del modelo (hoja, impactos), reutilizada en frames sin cambios
+        self.ultima_deteccion = None
+        self.threads = []
+        # Referencias de visores activos; la sesión se apaga sola tras quedar ociosa
+        self.refs = 0
+        self.ultimo_uso = time.monotonic()
+
+    def captura_de(self, perfil: str):
+        """Supervisor que alimenta el ring del perfil."""
+        if perfil in self.encoder.rings_perfil and self.captura_preview is not None:
+            return self.captura_preview
+        return self.captura
+
+    @property
+    def detenido(self):
+        return self.stop_event.is_set()
+
+    def start(self, targets):
+        self.threads = [threading.Thread(target=t, args=(self,), daemon=True, name=f"{t.__name__}-{self.camera_id}")
+                        for t in targets]
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for captura in self.capturas:
+            captura.interrumpir()
+            captura.ring.cerrar()
+        with self.cond:
+            self.cond.notify_all()
+        for t in self.threads:
+            if t is not threading.current_thread():
+                t.join(timeout=5)
+                if t.is_alive():
+                    logger.warning("El hilo %s no terminó al detener la cámara %s", t.name, self.camera_id)
+
+    def pausar(self):
+        self.pause_detection = True
+
+    def reanudar(self):
+        self.cambio.reiniciar()
+        self.pause_detection = False
+
+    def publicar(self, snapshot):
+        with self.cond:
+            self.version += 1
+            self.snapshot = dict(snapshot, version=self.version)
+            self.cond.notify_all()
+
+    def estado(self):
+        return {
+            "camara": self.camera_id,
+            "ip": self.ip,
+            "visores": self.refs,
+            "pausada": self.pause_detection,
+            "frame_seq": self.ring.seq,
+            "version": self.version,
+            **self.cambio.estadisticas(),
+            **self.calibracion.estadisticas(),
+            "captura": {c.nombre: c.estadisticas() for c in self.capturas},
+        }
+
+
+class SessionRegistry:
+    """
+    Registro de sesiones por id de cámara (por defecto su IP). adquirir()/liberar()
+    llevan la cuenta de visores; un hilo de limpieza apaga ffmpeg y une los hilos
+    de las sesiones que quedan sin visores por más de idle_timeout segundos.
+    """
+
+    def __init__(self, targets, idle_timeout: float = CAMERA_IDLE_TIMEOUT):
+        self.targets = targets
+        self.idle_timeout = idle_timeout
+        self._sesiones = {}
+        self._lock = threading.Lock()
+        self._actual = None
+        self._reaper = None
+
+    def adquirir(self, camera_id: str, ip: str = None):
+        """Obtiene (o arranca) la sesión de la cámara y suma un visor."""
+        with self._lock:
+            session = self._sesiones.get(camera_id)
+            if session is None or session.detenido:
+                session = CameraSession(camera_id, ip or camera_id)
+                self._sesiones[camera_id] = session
+                session.start(self.targets)
+            session.refs += 1
+            session.ultimo_uso = time.monotonic()
+            self._actual = camera_id
+            self._iniciar_reaper()
+            return session
+
+    def liberar(self, session: CameraSession):
+        with self._lock:
+            session.refs = max(0, session.refs - 1)
+            session.ultimo_uso = time.monotonic()
+
+    def obtener(self, camera_id: str = None):
+        """Sesión activa de la cámara; sin id, la última cámara abierta (compatibilidad)."""
+        with self._lock:
+            session = self._sesiones.get(camera_id if camera_id is not None else self._actual)
+        if session is None or session.detenido:
+            return None
+        return session
+
+    def detener(self, camera_id: str = None):
+        """Detiene una cámara, o todas si no se indica id."""
+        with self._lock:
+            if camera_id is None:
+                sesiones = list(self._sesiones.values())
+                self._sesiones.clear()
+            else:
+                session = self._sesiones.pop(camera_id, None)
+                sesiones = [session] if session else []
+        for session in sesiones:
+            session.stop()
+        return len(sesiones)
+
+    def sesiones(self):
+        with self._lock:
+            return [s for s in self._sesiones.values() if not s.detenido]
+
+    def _iniciar_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._limpiar_ociosas, daemon=True, name="camera-reaper")
+            self._reaper.start()
+
+    def _limpiar_ociosas(self):
+        while True:
+            time.sleep(min(5.0, self.idle_timeout))
+            ahora = time.monotonic()
+            with self._lock:
+                ociosas = [cid for cid, s in self._sesiones.items()
+                           if s.refs == 0 and ahora - s.ultimo_uso > self.idle_timeout]
+                sesiones = [self._sesiones.pop(cid) for cid in ociosas]
+            for session in sesiones:
+                logger.info("Deteniendo cámara %s por inactividad", session.camera_id)
+                session.stop()
@@ -0,0 +1,119 @@
+"""
+Inferencia por mosaicos (tiles) para impactos pequeños.
+
+El frame completo se reduce a imgsz=640 antes de entrar al modelo, así que un
+agujero lejano queda en uno o dos píxeles. En modo tiles la región de la hoja
+se corta en recortes solapados de tile x tile que entran al modelo sin reducir;
+los tiles se envían juntos al InferenceScheduler, que los resuelve en una pasada
+por lotes, y las detecciones se unen con NMS por clase.
+"""
+import math
+import time
+import logging
+import numpy as np
+from concurrent.futures import wait
+from . import postproceso
+
+logger = logging.getLogger(__name__)
+
+
+def generar_tiles(region, tile: int, solape: int):
+    """Tiles (x1, y1, x2, y2) que cubren la región con al menos el solape indicado, repartidos parejo."""
+    rx1, ry1, rx2, ry2 = region
+    paso = max(1, tile - solape)
+
+    def inicios(a, b):
+        if b - a <= tile:
+            return [a]
+        n = math.ceil((b - a - solape) / paso)
+        return [int(round(v)) for v in np.linspace(a, b - tile, n)]
+
+    return [(x, y, min(x + tile, rx2), min(y + tile, ry2))
+            for y in inicios(ry1, ry2) for x in inicios(rx1, rx2)]
+
+
+def nms(data, iou_max: float = 0.5):
+    """NMS por clase sobre un arreglo N x 6 (x1, y1, x2, y2, conf, cls)."""
+    if len(data) == 0:
+        return data
+    conservar = []
+    for cls in np.unique(data[:, 5]):
+        idx = np.flatnonzero(data[:, 5] == cls)
+        idx = idx[np.argsort(-data[idx, 4], kind="stable")]
+        while len(idx):
+            i, resto = idx[0], idx[1:]
+            conservar.append(i)
+            b, otros = data[i, :4], data[resto, :4]
+            ix = np.clip(np.minimum(b[2], otros[:, 2]) - np.maximum(b[0], otros[:, 0]), 0, None)
+            iy = np.clip(np.minimum(b[3], otros[:, 3]) - np.maximum(b[1], otros[:, 1]), 0, None)
+            inter = ix * iy
+            union = (b[2] - b[0]) * (b[3] - b[1]) + (otros[:, 2] - otros[:, 0]) * (otros[:, 3] - otros[:, 1]) - inter
+            idx = resto[inter / np.maximum(union, 1e-9) <= iou_max]
+    return data[np.sort(conservar)]
+
+
+def _sin_bordes_internos(data, tile, region, margen):
+    """Descarta cajas cortadas por un borde del tile que no es borde de la región (las ve entero otro tile)."""
+    tx1, ty1, tx2, ty2 = tile
+    rx1, ry1, rx2, ry2 = region
+    ok = np.ones(len(data), bool)
+    if tx1 > rx1:
+        ok &= data[:, 0] > tx1 + margen
+    if ty1 > ry1:
+        ok &= data[:, 1] > ty1 + margen
+    if tx2 < rx2:
+        ok &= data[:, 2] < tx2 - margen
+    if ty2 < ry2:
+        ok &= data[:, 3] < ty2 - margen
+    return data[ok]
+
+
+class InferenciaTiles:
+    def __init__(self, scheduler, tile: int, solape: int, presupuesto_ms: float, margen_borde: int = 2):
+        self.scheduler = scheduler
+        self.tile = tile
+        self.solape = solape
+        self.presupuesto = presupuesto_ms / 1000.0
+        self.margen_borde = margen_borde
+        self.ultima = {}
+
+    def detectar(self, frame, region=None, id_clase=None):
+        """
+        Detecciones N x 6 en coordenadas del frame para la región (por defecto el frame
+        completo). Si se indica id_clase, solo se conservan las de esa clase. Los tiles
+        que no terminan dentro del presupuesto se descartan.
+        """
+        alto, ancho = frame.shape[:2]
+        if region is None:
+            region = (0, 0, ancho, alto)
+        rx1, ry1, rx2, ry2 = (int(v) for v in region)
+        region = (max(0, rx1), max(0, ry1), min(ancho, rx2), min(alto, ry2))
+        tiles = generar_tiles(region, self.tile, self.solape)
+        inicio = time.monotonic()
+        futures = {self.scheduler.submit(frame[y1:y2, x1:x2]): (x1, y1, x2, y2) for x1, y1, x2, y2 in tiles}
+        hechos, pendientes = wait(futures, timeout=self.presupuesto)
+        for future in pendientes:
+            future.cancel()
+        partes = []
+        for future in hechos:
+            if future.exception() is not None:
+                continue
+            x1, y1, x2, y2 = futures[future]
+            data = postproceso.detecciones_array(future.result()).copy()
+            if id_clase is not None:
+                data = data[data[:, 5] == id_clase]
+            data[:, [0, 2]] += x1
+            data[:, [1, 3]] += y1
+            partes.append(_sin_bordes_internos(data, (x1, y1, x2, y2), region, self.margen_borde))
+        self.ultima = {
+            "tiles": len(tiles),
+            "completados": len(hechos),
+            "descartados": len(pendientes),
+            "ms": round((time.monotonic() - inicio) * 1000, 1),
+        }
+        if pendientes:
+            logger.warning("Inferencia por tiles fuera de presupuesto: %d de %d tiles descartados",
+                           len(pendientes), len(tiles))
+        if not partes:
+            return np.zeros((0, 6), np.float32)
+        return nms(np.concatenate(partes))
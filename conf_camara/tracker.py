@@ -0,0 +1,133 @@
+"""
+Seguimiento de impactos entre frames para una hoja.
+
+En lugar de reemplazar las detecciones con lo que vio el último frame, cada
+detección se asocia por posición con los impactos ya conocidos. Un impacto se
+confirma tras varias detecciones y desde entonces se mantiene aunque algún frame
+no lo detecte; la celda y las medidas solo se recalculan cuando cambia el
+conjunto de impactos confirmados o la hoja se mueve.
+
+El "hits" publicado no es la cuenta en vivo: el snapshot se vuelve a publicar
+cuando la cuenta de algún impacto confirmado cruza una potencia de 2 (2, 4, 8...),
+así que es una cota inferior que a lo sumo duplica su valor antes de actualizarse.
+"""
+import numpy as np
+from . import postproceso
+from .config import TRACKER_TOLERANCIA, TRACKER_MIN_HITS, TRACKER_MAX_MISSES, TRACKER_IOU_HOJA
+
+
+class ImpactTracker:
+    def __init__(self, tolerancia=TRACKER_TOLERANCIA, min_hits=TRACKER_MIN_HITS,
+                 max_misses=TRACKER_MAX_MISSES, iou_hoja=TRACKER_IOU_HOJA, calibracion=None):
+        self.tolerancia = tolerancia
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.iou_hoja = iou_hoja
+        # CalibracionHoja opcional: medidas en cm por homografía en lugar de por la bbox
+        self.calibracion = calibracion
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.hoja = None
+        self._hoja_misses = 0
+        # Por impacto: bbox acumulada (float), hits, misses consecutivos
+        self._bboxes = np.zeros((0, 4), np.float64)
+        self._hits = np.zeros(0, np.int64)
+        self._misses = np.zeros(0, np.int64)
+        self._confirmados = frozenset()
+        self._niveles = ()
+        self._ids = np.zeros(0, np.int64)
+        self._siguiente_id = 0
+        self.snapshot = {"hoja": None, "impactos": [], "celda": None, "medidas": "", "dispersion": None, "hits": []}
+
+    def actualizar(self, hoja, bboxes):
+        """
+        Incorpora las detecciones de un frame (hoja float o None, bboxes enteras de
+        impactos dentro de la hoja). Devuelve True si el snapshot cambió.
+        """
+        if hoja is None:
+            self._hoja_misses += 1
+            if self.hoja is not None and self._hoja_misses > self.max_misses:
+                self.reiniciar()
+                return True
+            return False
+        self._hoja_misses = 0
+        hoja = hoja.tolist()
+        hoja_movida = self.hoja is None or postproceso.iou(self.hoja, hoja) < self.iou_hoja
+        if self.hoja is not None and hoja_movida:
+            # Otra hoja (o la cámara se movió): los impactos anteriores ya no aplican
+            self.reiniciar()
+        if hoja_movida:
+            self.hoja = hoja
+        self._asociar(np.asarray(bboxes, np.float64).reshape(-1, 4))
+        mascara = self._hits >= self.min_hits
+        confirmados = frozenset(self._ids[mascara].tolist())
+        # Orden de magnitud (bit_length) de cada cuenta confirmada, en el orden de _ids
+        niveles = tuple(int(h).bit_length() for h in self._hits[mascara].tolist())
+        if not hoja_movida and confirmados == self._confirmados and niveles == self._niveles:
+            return False
+        self._confirmados = confirmados
+        self._niveles = niveles
+        self._recalcular()
+        return True
+
+    def _asociar(self, detectadas):
+        centros_det = (detectadas[:, 0:2] + detectadas[:, 2:4]) / 2
+        centros_trk = (self._bboxes[:, 0:2] + self._bboxes[:, 2:4]) / 2
+        asignada_det = np.zeros(len(detectadas), bool)
+        asignado_trk = np.zeros(len(self._bboxes), bool)
+        if len(detectadas) and len(self._bboxes):
+            # Distancias al cuadrado por eje: evita el arreglo n x m x 2 y la raíz
+            dx = np.subtract.outer(centros_det[:, 0], centros_trk[:, 0])
+            dist = np.subtract.outer(centros_det[:, 1], centros_trk[:, 1])
+            dist *= dist
+            dx *= dx
+            dist += dx
+            # Asignación voraz por menor distancia, uno a uno; solo se ordenan los pares
+            # dentro de la tolerancia, no los n x m
+            cerca_d, cerca_t = np.nonzero(dist < self.tolerancia * self.tolerancia)
+            orden = np.argsort(dist[cerca_d, cerca_t], kind="stable")
+            usadas_det, usados_trk, pares_d, pares_t = set(), set(), [], []
+            for d, t in zip(cerca_d[orden].tolist(), cerca_t[orden].tolist()):
+                if d in usadas_det or t in usados_trk:
+                    continue
+                usadas_det.add(d)
+                usados_trk.add(t)
+                pares_d.append(d)
+                pares_t.append(t)
+            # Cada impacto aparece a lo sumo una vez: se actualizan todos de una vez
+            asignada_det[pares_d] = True
+            asignado_trk[pares_t] = True
+            n = np.minimum(self._hits[pares_t], 10)[:, None]
+            self._bboxes[pares_t] = (self._bboxes[pares_t] * n + detectadas[pares_d]) / (n + 1)
+            self._hits[pares_t] += 1
+            self._misses[pares_t] = 0
+        self._misses[~asignado_trk] += 1
+        # Los impactos sin confirmar que dejan de verse se descartan; los confirmados se conservan
+        vivos = (self._hits >= self.min_hits) | (self._misses <= self.max_misses)
+        nuevos = detectadas[~asignada_det]
+        self._bboxes = np.concatenate([self._bboxes[vivos], nuevos])
+        self._hits = np.concatenate([self._hits[vivos], np.ones(len(nuevos), np.int64)])
+        self._misses = np.concatenate([self._misses[vivos], np.zeros(len(nuevos), np.int64)])
+        ids_nuevos = np.arange(self._siguiente_id, self._siguiente_id + len(nuevos))
+        self._siguiente_id += len(nuevos)
+        self._ids = np.concatenate([self._ids[vivos], ids_nuevos])
+
+    def _recalcular(self):
+        confirmados = self._hits >= self.min_hits
+        bboxes = self._bboxes[confirmados].astype(np.int64)
+        centros = postproceso.centros(bboxes)
+        hoja_int = np.asarray(self.hoja).astype(np.int64)
+        if self.calibracion is not None:
+            celda, medidas, dispersion = self.calibracion.medir(centros, hoja_int)
+        else:
+            celda, medidas = postproceso.celda_y_medidas(centros, hoja_int)
+            dispersion = None
+        self.snapshot = {
+            "hoja": self.hoja,
+            "impactos": postproceso.como_lista(bboxes, centros),
+            "celda": celda,
+            "medidas": medidas,
+            "dispersion": dispersion,
+            "hits": self._hits[confirmados].tolist(),
+        }
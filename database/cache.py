@@ -0,0 +1,89 @@
+import json
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTTL:
+    """
+    Cache en memoria de resultados de consultas, con vencimiento por TTL y
+    etiquetas para invalidar: las escrituras llaman a invalidar(etiqueta) y se
+    descartan todas las entradas marcadas con ella. Un resultado que se estaba
+    calculando mientras se invalidó su etiqueta no se guarda.
+    """
+
+    def __init__(self, ttl: float = 60, max_entradas: int = 512):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._generaciones = {}
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._invalidaciones = 0
+
+    def obtener(self, clave, calcular, etiquetas=(), ttl: float = None):
+        """Valor cacheado para la clave o, si no hay uno vigente, el resultado de calcular()."""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._entradas.move_to_end(clave)
+                self._aciertos += 1
+                return entrada[1]
+            self._fallos += 1
+            generaciones = tuple(self._generaciones.get(e, 0) for e in etiquetas)
+        valor = calcular()
+        with self._lock:
+            if generaciones == tuple(self._generaciones.get(e, 0) for e in etiquetas):
+                self._entradas[clave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor, tuple(etiquetas))
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    def invalidar(self, etiqueta: str):
+        with self._lock:
+            self._generaciones[etiqueta] = self._generaciones.get(etiqueta, 0) + 1
+            claves = [c for c, e in self._entradas.items() if etiqueta in e[2]]
+            for clave in claves:
+                del self._entradas[clave]
+            self._invalidaciones += 1
+        logger.debug("Cache invalidado para '%s': %d entradas", etiqueta, len(claves))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self._aciertos,
+                "fallos": self._fallos,
+                "invalidaciones": self._invalidaciones,
+            }
+
+
+cache = CacheTTL()
+
+# Datos de referencia (roles, municiones, series): cambian rara vez
+TTL_REFERENCIA = 300
+
+
+def _serializar(valor):
+    cuerpo = json.dumps(valor, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return cuerpo, '"' + hashlib.sha1(cuerpo).hexdigest() + '"'
+
+
+def respuesta_json(request, clave, calcular, etiquetas=(), ttl: float = TTL_REFERENCIA):
+    """
+    Respuesta JSON servida desde el cache (ya serializada, con su ETag). Si el
+    cliente envía un If-None-Match que coincide se responde 304 sin cuerpo.
+    """
+    cuerpo, etag = cache.obtener(clave, lambda: _serializar(calcular()), etiquetas, ttl)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
@@ -1,9 +1,269 @@
 import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import extensions
+from monitoreo.metricas import Histograma, Medidor
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+# Segundos: vida máxima de una conexión, espera máxima para obtener una y
+# tiempo ocioso tras el cual se verifica con SELECT 1 antes de entregarla
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+DB_POOL_HEALTH_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_INTERVAL", 30))
+
+
+ESPERA_CONEXION = Histograma("db_espera_conexion_segundos", "Espera para obtener una conexión del pool")
+CONSULTA = Histograma("db_consulta_segundos", "Duración de execute/executemany/copy_expert")
+
+
+class CursorMedido(extensions.cursor):
+    """Cursor que registra la duración de cada consulta en db_consulta_segundos."""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            CONSULTA.observar(time.perf_counter() - inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            CONSULTA.observar(time.perf_counter() - inicio)
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            CONSULTA.observar(time.perf_counter() - inicio)
+
+
+class PoolAgotado(Exception):
+    """No se pudo obtener una conexión del pool dentro del timeout."""
+
+
+class _Entrada:
+    __slots__ = ("conn", "creada", "usada")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada = self.usada = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Pool acotado y thread-safe de conexiones psycopg2. Mantiene al menos min_size
+    conexiones abiertas y nunca más de max_size; quien pide una conexión con el
+    pool lleno espera hasta timeout y luego recibe PoolAgotado. Las conexiones que
+    superan max_lifetime se reemplazan y las que estuvieron ociosas más de
+    health_interval se verifican antes de entregarse.
+    """
+
+    def __init__(self, dsn, min_size: int = DB_POOL_MIN, max_size: int = DB_POOL_MAX,
+                 max_lifetime: float = DB_POOL_MAX_LIFETIME, timeout: float = DB_POOL_TIMEOUT,
+                 health_interval: float = DB_POOL_HEALTH_INTERVAL):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_interval = health_interval
+        # LIFO: se reutiliza primero la conexión usada más recientemente
+        self._libres = deque()
+        self._en_uso = {}
+        # Conexiones libres + en uso + en proceso de apertura
+        self._total = 0
+        self._esperando = 0
+        self._cerrado = False
+        self._cond = threading.Condition()
+        self._adquisiciones = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._timeouts = 0
+        self._creadas = 0
+        self._descartadas = 0
+        self._fallas_salud = 0
+
+    def abrir(self):
+        """Abre las min_size conexiones iniciales; un error se registra y el pool abre bajo demanda."""
+        with self._cond:
+            self._cerrado = False
+            faltan = self.min_size - self._total
+            self._total += max(0, faltan)
+        for _ in range(max(0, faltan)):
+            try:
+                entrada = self._crear()
+            except psycopg2.Error as e:
+                logger.error("Error al conectar con PostgreSQL: %s", e)
+                with self._cond:
+                    self._total -= 1
+                continue
+            with self._cond:
+                self._libres.append(entrada)
+                self._cond.notify()
+
+    def _crear(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=CursorMedido)
+        with self._cond:
+            self._creadas += 1
+        return _Entrada(conn)
+
+    def _sana(self, entrada):
+        ahora = time.monotonic()
+        if entrada.conn.closed or ahora - entrada.creada > self.max_lifetime:
+            return False
+        if ahora - entrada.usada > self.health_interval:
+            try:
+                cur = entrada.conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                entrada.conn.rollback()
+            except psycopg2.Error:
+                with self._cond:
+                    self._fallas_salud += 1
+                return False
+        return True
+
+    def _descartar(self, entrada):
+        try:
+            entrada.conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._descartadas += 1
+            self._cond.notify()
+
+    def adquirir(self, timeout: float = None):
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._cerrado:
+                        raise PoolAgotado("El pool de conexiones está cerrado")
+                    if self._libres:
+                        entrada = self._libres.pop()
+                        break
+                    if self._total < self.max_size:
+                        self._total += 1
+                        entrada = None
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolAgotado(f"Sin conexiones libres tras {timeout:.1f} s")
+                    self._esperando += 1
+                    self._cond.wait(restante)
+                    self._esperando -= 1
+            if entrada is None:
+                try:
+                    entrada = self._crear()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._sana(entrada):
+                self._descartar(entrada)
+                continue
+            espera = time.monotonic() - inicio
+            ESPERA_CONEXION.observar(espera)
+            with self._cond:
+                self._en_uso[id(entrada.conn)] = entrada
+                self._adquisiciones += 1
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+            return entrada.conn
+
+    def liberar(self, conn, descartar: bool = False):
+        """Devuelve la conexión al pool; una transacción abierta se revierte."""
+        with self._cond:
+            entrada = self._en_uso.pop(id(conn), None)
+        if entrada is None:
+            return
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+        ahora = time.monotonic()
+        if descartar or conn.closed or self._cerrado or ahora - entrada.creada > self.max_lifetime:
+            self._descartar(entrada)
+            return
+        entrada.usada = ahora
+        with self._cond:
+            self._libres.append(entrada)
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self, timeout: float = None):
+        conn = self.adquirir(timeout)
+        descartar = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # La conexión pudo quedar rota; no vuelve al pool
+            descartar = True
+            raise
+        finally:
+            self.liberar(conn, descartar)
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            libres, self._libres = list(self._libres), deque()
+            self._cond.notify_all()
+        for entrada in libres:
+            self._descartar(entrada)
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                "min": self.min_size,
+                "max": self.max_size,
+                "abiertas": self._total,
+                "en_uso": len(self._en_uso),
+                "libres": len(self._libres),
+                "esperando": self._esperando,
+                "adquisiciones": self._adquisiciones,
+                "espera_media_ms": round(self._espera_total / self._adquisiciones * 1000, 2) if self._adquisiciones else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 2),
+                "timeouts": self._timeouts,
+                "creadas": self._creadas,
+                "descartadas": self._descartadas,
+                "fallas_salud": self._fallas_salud,
+            }
+
+
+pool = ConnectionPool(DATABASE_URL)
+Medidor("db_pool_conexiones", "Conexiones del pool por estado",
+        lambda: {k: v for k, v in pool.estadisticas().items() if k in ("en_uso", "libres", "esperando")},
+        etiqueta="estado")
+
+
+def conexion(timeout: float = None):
+    """Context manager: conexión del pool que se devuelve (con rollback si quedó abierta) al salir."""
+    return pool.conexion(timeout)
+
 
 def get_connection():
+    """Conexión directa fuera del pool, para scripts; la API usa conexion()."""
     try:
-        conn = psycopg2.connect(os.environ.get("DATABASE_URL"))
+        conn = psycopg2.connect(DATABASE_URL)
         return conn
     except Exception as e:
         print("Error al conectar con PostgreSQL:", e)
@@ -0,0 +1,4 @@
+-- Foto e informe de prueba pasan al blob store; la fila guarda solo el sha256 del contenido.
+-- Las columnas bytea se conservan para las filas anteriores a este cambio.
+ALTER TABLE prueba ADD COLUMN IF NOT EXISTS foto_hash VARCHAR(64);
+ALTER TABLE prueba ADD COLUMN IF NOT EXISTS informe_hash VARCHAR(64);
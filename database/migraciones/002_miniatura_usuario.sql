@@ -0,0 +1,2 @@
+-- Miniatura JPEG de la foto de usuario, generada al subirla; el listado solo lee esta columna.
+ALTER TABLE usuario ADD COLUMN IF NOT EXISTS foto_miniatura BYTEA;
@@ -1,11 +1,19 @@
 # main.py
 import os
+import json
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from routes import roles, usuarios, municiones, prueba
 from conf_camara import camera, network
+from database.connection import pool, PoolAgotado
+from database.cache import cache
+from seguridad import contrasenas
+from monitoreo import metricas
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,14 +21,16 @@ logger = logging.getLogger(__name__)
 os.environ["YOLO_CONFIG_DIR"] = "/tmp/Ultralytics"
 PORT = int(os.environ.get("PORT", 8000))
 
-try:
-    from ultralytics import YOLO
-    camera.model = YOLO("yolov8n.pt")
-    logger.info("Modelo YOLO cargado correctamente")
-except Exception as e:
-    logger.error(f"No se pudo cargar el modelo YOLO: {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El modelo se carga en segundo plano: la API (login, rutas de BD) responde de inmediato
+    camera.modelos.iniciar_warmup()
+    # Las conexiones mínimas del pool también se abren sin bloquear el arranque
+    threading.Thread(target=pool.abrir, daemon=True, name="db-pool").start()
+    yield
+    pool.cerrar()
 
-app = FastAPI(title="Backend Precision", version="1.0.0")
+app = FastAPI(title="Backend Precision", version="1.0.0", lifespan=lifespan)
 
 origins = [
     "https://frontend-precision.vercel.app",
@@ -34,61 +44,174 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Siguiente-Cursor"],
 )
 
+PETICIONES = metricas.Histograma("http_peticion_segundos", "Tiempo hasta el inicio de la respuesta HTTP",
+                                 ("metodo", "ruta"))
+
+class MedirPeticiones:
+    """
+    Middleware ASGI: mide hasta http.response.start (los streams MJPEG/NDJSON
+    cuentan solo hasta que empiezan a enviar). La ruta es la plantilla del
+    router, no el path, para no crear una serie por id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        medido = False
+
+        def medir():
+            nonlocal medido
+            if not medido:
+                medido = True
+                ruta = scope.get("route")
+                PETICIONES.hijo(scope["method"], ruta.path if ruta is not None else "otra").observar(
+                    time.perf_counter() - inicio)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                medir()
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Una excepción no manejada la responde (500) un middleware externo
+            medir()
+
+app.add_middleware(MedirPeticiones)
+
+@app.exception_handler(PoolAgotado)
+async def pool_agotado(request, exc):
+    return JSONResponse(content={"error": "Base de datos ocupada, intente nuevamente"}, status_code=503)
+
+def modelo_no_listo():
+    if camera.modelos.listo:
+        return None
+    return JSONResponse(content={"error": "El modelo se está cargando", **camera.modelos.estado()}, status_code=503)
+
+@app.get("/salud")
+def salud():
+    estado = camera.modelos.estado()
+    return JSONResponse(content={"api": "ok", "modelo": estado, "hash": contrasenas.ejecutor.estadisticas()},
+                        status_code=200 if camera.modelos.listo else 503)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/detecciones_area")
 @app.get("/detecciones_area")
-def get_detecciones_area(x1: int, y1: int, x2: int, y2: int, impactos_data: dict = Body(None)):
+def get_detecciones_area(x1: int, y1: int, x2: int, y2: int, impactos_data: dict = Body(None), camara: str = None):
+    no_listo = modelo_no_listo()
+    if no_listo is not None:
+        return no_listo
     impactos_manual = impactos_data.get('impactos_manual') if impactos_data else None
     impactos_eliminados = impactos_data.get('impactos_eliminados') if impactos_data else None
-    data = camera.detectar_area(x1, y1, x2, y2, impactos_manual, impactos_eliminados)
+    try:
+        data = camera.detectar_area(x1, y1, x2, y2, impactos_manual, impactos_eliminados, camara)
+    except camera.RoiInvalida as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     if data is None:
         return {"error": "No hay frame disponible"}
     return data
 
 @app.get("/detectar_camara")
-def detectar_camara():
-    ip = network.scan_for_camera_ip()
-    return {"ip": ip} if ip else {"ip": None, "error": "No se detectó ninguna cámara en la red"}
+async def detectar_camara(completo: bool = False):
+    camaras = await network.buscar_camaras(completo=completo)
+    if not camaras:
+        return {"ip": None, "camaras": [], "error": "No se detectó ninguna cámara en la red"}
+    return {"ip": camaras[0]["ip"], "camaras": camaras}
+
+@app.get("/detectar_camara/stream")
+async def detectar_camara_stream(completo: bool = False):
+    """Cada cámara se envía como una línea JSON apenas se encuentra."""
+    async def lineas():
+        async for camara in network.descubrir(completo=completo):
+            yield json.dumps(camara) + "\n"
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
 
 @app.get("/video_feed")
-def video_feed(ip: str):
-    video_gen = camera.generate_video_stream(ip)
+def video_feed(ip: str, camara: str = None, perfil: str = "full", fps: float = camera.STREAM_FPS):
+    if perfil not in camera.STREAM_PROFILES:
+        return JSONResponse(content={"error": f"Perfil desconocido: {perfil}", "perfiles": list(camera.STREAM_PROFILES)}, status_code=400)
+    video_gen = camera.generate_video_stream(ip, camara, perfil, fps)
     if video_gen is None:
         return JSONResponse(content={"error": "No se pudo abrir el stream"}, status_code=500)
     return StreamingResponse(video_gen, media_type="multipart/x-mixed-replace; boundary=frame")
 
 @app.get("/detener_camara")
-def detener_camara():
-    camera.stop_streaming = True
-    with camera.frame_lock:
-        camera.current_frame = None
+def detener_camara(camara: str = None):
+    camera.registry.detener(camara)
     return {"mensaje": "Transmisión detenida exitosamente"}
 
 @app.get("/pausar_deteccion")
-def pausar_deteccion():
-    camera.pause_detection = True
+def pausar_deteccion(camara: str = None):
+    session = camera.registry.obtener(camara)
+    if session is None:
+        return JSONResponse(content={"error": "La cámara no está activa"}, status_code=404)
+    session.pausar()
     return {"mensaje": "Detección pausada"}
 
 @app.get("/reanudar_deteccion")
-def reanudar_deteccion():
-    camera.pause_detection = False
+def reanudar_deteccion(camara: str = None):
+    session = camera.registry.obtener(camara)
+    if session is None:
+        return JSONResponse(content={"error": "La cámara no está activa"}, status_code=404)
+    session.reanudar()
     return {"mensaje": "Detección reanudada"}
 
 @app.get("/detecciones")
-def get_detecciones():
+def get_detecciones(camara: str = None):
+    no_listo = modelo_no_listo()
+    if no_listo is not None:
+        return no_listo
+    snapshot = camera.obtener_snapshot(camara)
     return {
-        "hoja": camera.last_best_box.xyxy[0].tolist() if camera.last_best_box else None,
-        "impactos": [{"bbox": bbox, "centro": centro} for bbox, centro in camera.last_impactos],
-        "celda": camera.last_celda_coords,
-        "medidas": camera.last_medidas_texto,
+        "hoja": snapshot["hoja"],
+        # hits es una cota inferior: se actualiza al cruzar potencias de 2 (ver tracker)
+        "impactos": [{"bbox": bbox, "centro": centro, "hits": hits}
+                     for (bbox, centro), hits in zip(snapshot["impactos"], snapshot["hits"])],
+        "celda": snapshot["celda"],
+        "medidas": snapshot["medidas"],
+        "dispersion": snapshot["dispersion"],
+        "version": snapshot["version"],
     }
 
+@app.get("/camaras")
+def listar_camaras():
+    return [session.estado() for session in camera.registry.sesiones()]
+
+@app.get("/inferencia/estadisticas")
+def estadisticas_inferencia():
+    return {**camera.scheduler.estadisticas(), "cache_roi": camera.cache_roi.estadisticas(),
+            "tiles": camera.tiles.ultima}
+
+@app.get("/db/estadisticas")
+def estadisticas_db():
+    return {**pool.estadisticas(), "cache": cache.estadisticas()}
+
+@app.post("/db/cache/invalidar")
+def invalidar_cache(etiqueta: str):
+    """Para cambios hechos fuera de la API (p. ej. roles, municiones o series editados en la BD)."""
+    cache.invalidar(etiqueta)
+    return {"invalidado": etiqueta}
+
 @app.get("/obtener_celda_actual")
-async def obtener_celda_actual():
-    hoja_coords = list(map(int, camera.last_best_box.xyxy[0])) if camera.last_best_box else None
-    celda_coords = list(camera.last_celda_coords) if camera.last_celda_coords else None
-    medidas = camera.last_medidas_texto if camera.last_medidas_texto else ""
+async def obtener_celda_actual(camara: str = None):
+    no_listo = modelo_no_listo()
+    if no_listo is not None:
+        return no_listo
+    snapshot = camera.obtener_snapshot(camara)
+    hoja_coords = list(map(int, snapshot["hoja"])) if snapshot["hoja"] else None
+    celda_coords = list(snapshot["celda"]) if snapshot["celda"] else None
+    medidas = snapshot["medidas"] if snapshot["medidas"] else ""
     if hoja_coords:
         return {"hoja": hoja_coords, "celda": celda_coords, "medidas": medidas, "success": True}
     return {"hoja": None, "celda": celda_coords, "medidas": medidas, "success": False, "message": "No hay hoja detectada actualmente"}
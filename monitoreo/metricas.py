@@ -0,0 +1,159 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (endpoint /metrics).
+
+Contadores e histogramas se crean una vez al importar cada módulo y cada
+combinación de etiquetas se resuelve a su hijo una sola vez (hijo()); registrar
+una observación es un bisect y dos sumas bajo un lock, sin crear objetos, así
+que se puede llamar por frame. Los medidores (gauges) se leen con una función
+recién al exponer, para colas y estados que ya mantiene otro componente.
+"""
+import threading
+from bisect import bisect_left
+
+# Segundos: de 1 ms a 10 s
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registro = []
+
+
+def _etiquetas(nombres, valores, extra=""):
+    partes = [f'{n}="{v}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _ValorContador:
+    __slots__ = ("valor", "_lock")
+
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+
+class _ValorHistograma:
+    __slots__ = ("limites", "cuentas", "suma", "_lock")
+
+    def __init__(self, limites):
+        self.limites = limites
+        # Un casillero por límite más +Inf; se acumulan recién al exponer
+        self.cuentas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        i = bisect_left(self.limites, valor)
+        with self._lock:
+            self.cuentas[i] += 1
+            self.suma += valor
+
+
+class _Familia:
+    tipo = None
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._hijos = {}
+        self._lock = threading.Lock()
+        self._defecto = None if self.etiquetas else self.hijo()
+        _registro.append(self)
+
+    def _nuevo(self):
+        raise NotImplementedError
+
+    def hijo(self, *valores):
+        """Serie para estos valores de etiqueta; conviene guardarla y reutilizarla."""
+        valores = tuple(str(v) for v in valores)
+        hijo = self._hijos.get(valores)
+        if hijo is None:
+            with self._lock:
+                hijo = self._hijos.setdefault(valores, self._nuevo())
+        return hijo
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for valores, hijo in list(self._hijos.items()):
+            lineas.extend(self._lineas(valores, hijo))
+        return lineas
+
+
+class Contador(_Familia):
+    tipo = "counter"
+
+    def _nuevo(self):
+        return _ValorContador()
+
+    def inc(self, n=1):
+        self._defecto.inc(n)
+
+    def _lineas(self, valores, hijo):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(hijo.valor)}"]
+
+
+class Histograma(_Familia):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.limites = tuple(limites)
+        super().__init__(nombre, ayuda, etiquetas)
+
+    def _nuevo(self):
+        return _ValorHistograma(self.limites)
+
+    def observar(self, valor):
+        self._defecto.observar(valor)
+
+    def _lineas(self, valores, hijo):
+        with hijo._lock:
+            cuentas, suma = list(hijo.cuentas), hijo.suma
+        lineas, acumulado = [], 0
+        for limite, cuenta in zip(self.limites + ("+Inf",), cuentas):
+            acumulado += cuenta
+            le = limite if limite == "+Inf" else _numero(float(limite))
+            etiquetas = _etiquetas(self.etiquetas, valores, 'le="' + le + '"')
+            lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+        etiquetas = _etiquetas(self.etiquetas, valores)
+        lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(suma)}")
+        lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """Gauge leído al exponer: funcion() devuelve un número o, con una etiqueta, un dict {valor: número}."""
+
+    def __init__(self, nombre: str, ayuda: str, funcion, etiqueta: str = None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiqueta = etiqueta
+        _registro.append(self)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        try:
+            valor = self.funcion()
+        except Exception:
+            return lineas
+        if self.etiqueta is None:
+            lineas.append(f"{self.nombre} {_numero(valor)}")
+        else:
+            for clave, v in valor.items():
+                lineas.append(f"{self.nombre}{_etiquetas((self.etiqueta,), (clave,))} {_numero(v)}")
+        return lineas
+
+
+def exponer():
+    lineas = []
+    for metrica in list(_registro):
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
@@ -1,14 +1,17 @@
-from fastapi import APIRouter
-from database.connection import get_connection
+from fastapi import APIRouter, Request
+from database.connection import conexion
+from database.cache import respuesta_json
 
 router = APIRouter()
 
-@router.get("/municiones")
-def get_municiones():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, calibre FROM municion")
-    municiones = [{"id": r[0], "calibre": r[1]} for r in cur.fetchall()]
-    cur.close()
-    conn.close()
+def _leer_municiones():
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, calibre FROM municion")
+        municiones = [{"id": r[0], "calibre": r[1]} for r in cur.fetchall()]
+        cur.close()
     return municiones
+
+@router.get("/municiones")
+def get_municiones(request: Request):
+    return respuesta_json(request, "municiones", _leer_municiones, etiquetas=("municiones",))
@@ -1,12 +1,89 @@
-from fastapi import APIRouter, Body
-from database.connection import get_connection
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from database.connection import conexion, PoolAgotado
+from database.cache import cache, respuesta_json
+from storage.blobs import blobs
+from fastapi.responses import JSONResponse, Response, FileResponse
+from datetime import date
+from email.utils import formatdate, parsedate_to_datetime
+import os
+import io
+import csv
+import json
 import base64
 
 router = APIRouter()
 
+BLOBS = (("foto", "la foto"), ("informe", "el informe PDF"))
+
+class PedidoInvalido(Exception):
+    """Cuerpo del pedido que no se puede interpretar (JSON mal formado)."""
+
+async def _leer_pedido(request: Request):
+    """
+    (datos, form): acepta el JSON de siempre (foto/informe en base64) o multipart
+    con un campo 'datos' (JSON) y los archivos foto/informe, que Starlette recibe
+    por bloques en archivos temporales en lugar de un string base64 en memoria.
+    """
+    form = None
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            data = json.loads(form.get("datos") or "{}")
+        else:
+            data = await request.json()
+        if not isinstance(data, dict):
+            raise ValueError("se esperaba un objeto")
+    except (ValueError, TypeError) as e:
+        if form is not None:
+            await form.close()
+        raise PedidoInvalido(f"JSON inválido: {e}")
+    return data, form
+
+def _vacio(archivo: StarletteUploadFile):
+    """Parte sin nombre ni contenido: lo que envía el navegador si el input de archivo quedó en blanco."""
+    if archivo.filename:
+        return False
+    vacio = not archivo.file.read(1)
+    archivo.file.seek(0)
+    return vacio
+
+def _guardar_blobs(data: dict, form):
+    """
+    Guarda en el blob store los archivos recibidos. Devuelve {campo: hash} solo con
+    los campos enviados (hash None si se envió vacío para quitarlo).
+    """
+    hashes = {}
+    for campo, descripcion in BLOBS:
+        archivo = form.get(campo) if form is not None else None
+        if isinstance(archivo, StarletteUploadFile) and not _vacio(archivo):
+            hashes[campo] = blobs.guardar_archivo(archivo.file)[0]
+        elif campo in data:
+            contenido_b64 = data.get(campo)
+            if not contenido_b64:
+                hashes[campo] = None
+                continue
+            try:
+                contenido = base64.b64decode(contenido_b64)
+            except Exception as e:
+                raise ValueError(f"Error al decodificar {descripcion}: {str(e)}")
+            hashes[campo] = blobs.guardar_bytes(contenido)[0]
+    return hashes
+
 @router.post("/guardar_prueba")
-def guardar_prueba(data: dict = Body(...)):
+async def guardar_prueba(request: Request):
+    try:
+        data, form = await _leer_pedido(request)
+    except PedidoInvalido as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    try:
+        return await run_in_threadpool(_guardar_prueba, data, form)
+    finally:
+        if form is not None:
+            await form.close()
+
+def _guardar_prueba(data: dict, form):
     fecha = data.get("fecha")
     ordentiro = data.get("ordentiro")
     lote = data.get("lote")
@@ -21,156 +98,245 @@ def guardar_prueba(data: dict = Body(...)):
     id_municion = data.get("id_municion")
     series = data.get("series", [])
     usuarios = data.get("usuarios", [])
-    foto_base64 = data.get("foto")
-    informe_base64 = data.get("informe")
 
     if not fecha:
         return JSONResponse({"error": "No se proporcionó la fecha"}, status_code=400)
 
-    foto_bytes = None
-    if foto_base64:
-        try:
-            foto_bytes = base64.b64decode(foto_base64)
-        except Exception as e:
-            return JSONResponse({"error": f"Error al decodificar la foto: {str(e)}"}, status_code=400)
-
-    informe_bytes = None
-    if informe_base64:
-        try:
-            informe_bytes = base64.b64decode(informe_base64)
-        except Exception as e:
-            return JSONResponse({"error": f"Error al decodificar el informe PDF: {str(e)}"}, status_code=400)
+    try:
+        hashes = _guardar_blobs(data, form)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
+        with conexion() as conn:
+            cur = conn.cursor()
 
-        cur.execute("""
-            INSERT INTO prueba (
-                fecha_inspeccion, ordentiro, lote, tamano, muestra, armamento, distancia_tiro,
-                base, altura, area_impactos, decision, id_municion, foto, informe
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            fecha, ordentiro, lote, tamano, muestra, armamento, distancia_tiro,
-            base, altura, area_impactos, decision, id_municion, foto_bytes, informe_bytes
-        ))
-        nuevo_id = cur.fetchone()[0]
-
-        for id_usuario in usuarios:
-            cur.execute("INSERT INTO participantes (id_usuario) VALUES (%s) RETURNING id", (id_usuario,))
-            id_participante = cur.fetchone()[0]
-            cur.execute("INSERT INTO prueba_participantes (id_prueba, id_participante) VALUES (%s, %s)", (nuevo_id, id_participante))
-
-        for id_serie in series:
-            cur.execute("INSERT INTO prueba_series (id_prueba, id_serie) VALUES (%s, %s)", (nuevo_id, id_serie))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            # Prueba, participantes y series en una sola sentencia (un único viaje a la BD)
+            cur.execute("""
+                WITH nueva AS (
+                    INSERT INTO prueba (
+                        fecha_inspeccion, ordentiro, lote, tamano, muestra, armamento, distancia_tiro,
+                        base, altura, area_impactos, decision, id_municion, foto_hash, informe_hash
+                    )
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                ), participantes_nuevos AS (
+                    INSERT INTO participantes (id_usuario)
+                    SELECT unnest(%s::int[])
+                    RETURNING id
+                ), enlaces AS (
+                    INSERT INTO prueba_participantes (id_prueba, id_participante)
+                    SELECT nueva.id, participantes_nuevos.id FROM nueva, participantes_nuevos
+                ), series_nuevas AS (
+                    INSERT INTO prueba_series (id_prueba, id_serie)
+                    SELECT nueva.id, unnest(%s::int[]) FROM nueva
+                )
+                SELECT id FROM nueva
+            """, (
+                fecha, ordentiro, lote, tamano, muestra, armamento, distancia_tiro,
+                base, altura, area_impactos, decision, id_municion, hashes.get("foto"), hashes.get("informe"),
+                list(usuarios), list(series)
+            ))
+            nuevo_id = cur.fetchone()[0]
+
+            conn.commit()
+            cur.close()
+        cache.invalidar("pruebas")
         return JSONResponse({"mensaje": "Prueba guardada correctamente", "id_prueba": nuevo_id})
+    except PoolAgotado:
+        raise
     except Exception as e:
-        if conn:
-            conn.rollback()
-            conn.close()
         return JSONResponse({"error": str(e)}, status_code=500)
 
 @router.put("/actualizar_prueba/{id_prueba}")
-def actualizar_prueba(id_prueba: int, data: dict = Body(...)):
+async def actualizar_prueba(id_prueba: int, request: Request):
+    try:
+        data, form = await _leer_pedido(request)
+    except PedidoInvalido as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    try:
+        return await run_in_threadpool(_actualizar_prueba, id_prueba, data, form)
+    finally:
+        if form is not None:
+            await form.close()
+
+def _actualizar_prueba(id_prueba: int, data: dict, form):
     base = data.get("base")
     altura = data.get("altura")
     area_impactos = data.get("area_impactos")
     decision = data.get("decision")
     series = data.get("series", [])
-    foto_base64 = data.get("foto")
-    informe_base64 = data.get("informe")
 
-    foto_bytes = None
-    if foto_base64:
-        try:
-            foto_bytes = base64.b64decode(foto_base64)
-        except Exception as e:
-            return JSONResponse({"error": f"Error al decodificar la foto: {str(e)}"}, status_code=400)
-
-    informe_bytes = None
-    if informe_base64:
-        try:
-            informe_bytes = base64.b64decode(informe_base64)
-        except Exception as e:
-            return JSONResponse({"error": f"Error al decodificar el informe PDF: {str(e)}"}, status_code=400)
+    try:
+        hashes = _guardar_blobs(data, form)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
+        with conexion() as conn:
+            cur = conn.cursor()
 
-        cur.execute("""
-            UPDATE prueba 
-            SET base = %s, 
-                altura = %s, 
-                area_impactos = %s, 
-                decision = %s,
-                foto = %s,
-                informe = %s
-            WHERE id = %s
-        """, (base, altura, area_impactos, decision, foto_bytes, informe_bytes, id_prueba))
-
-        cur.execute("SELECT id_serie FROM prueba_series WHERE id_prueba = %s", (id_prueba,))
-        series_existentes = [row[0] for row in cur.fetchall()]
-
-        for id_serie in series:
-            if id_serie not in series_existentes:
-                cur.execute("INSERT INTO prueba_series (id_prueba, id_serie) VALUES (%s, %s)", (id_prueba, id_serie))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            # Foto e informe solo cambian si se enviaron; el contenido ya no se reescribe en la fila.
+            # El UPDATE y el alta de las series que falten van en una sola sentencia.
+            cur.execute("""
+                WITH actualizada AS (
+                    UPDATE prueba 
+                    SET base = %s, 
+                        altura = %s, 
+                        area_impactos = %s, 
+                        decision = %s,
+                        foto_hash = CASE WHEN %s THEN %s ELSE foto_hash END,
+                        foto = CASE WHEN %s THEN NULL ELSE foto END,
+                        informe_hash = CASE WHEN %s THEN %s ELSE informe_hash END,
+                        informe = CASE WHEN %s THEN NULL ELSE informe END
+                    WHERE id = %s
+                )
+                INSERT INTO prueba_series (id_prueba, id_serie)
+                SELECT DISTINCT %s, s.id_serie
+                FROM unnest(%s::int[]) AS s(id_serie)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM prueba_series ps WHERE ps.id_prueba = %s AND ps.id_serie = s.id_serie
+                )
+            """, (base, altura, area_impactos, decision,
+                  "foto" in hashes, hashes.get("foto"), "foto" in hashes,
+                  "informe" in hashes, hashes.get("informe"), "informe" in hashes, id_prueba,
+                  id_prueba, list(series), id_prueba))
+
+            conn.commit()
+            cur.close()
+        cache.invalidar("pruebas")
         return JSONResponse({"mensaje": "Prueba actualizada correctamente", "id_prueba": id_prueba})
+    except PoolAgotado:
+        raise
     except Exception as e:
-        if conn:
-            conn.rollback()
-            conn.close()
         return JSONResponse({"error": str(e)}, status_code=500)
 
-@router.get("/series")
-def obtener_series():
+COLUMNAS_IMPORTACION = ("fecha", "ordentiro", "lote", "tamano", "muestra", "armamento", "distancia_tiro",
+                        "base", "altura", "area_impactos", "decision", "id_municion")
+IMPORTACION_MAX = 10000
+
+def _copiar(cur, tabla: str, columnas, filas):
+    """COPY de filas (tuplas) a la tabla en formato CSV; None se carga como NULL."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(filas)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def _reservar_ids(cur, tabla: str, cantidad: int):
+    if cantidad == 0:
+        return []
+    cur.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", (tabla, cantidad))
+    return [fila[0] for fila in cur.fetchall()]
+
+@router.post("/importar")
+def importar_pruebas(pruebas: list = Body(...)):
+    """
+    Importación masiva (migración de datos históricos) de pruebas con sus series y
+    participantes en una sola transacción. Los ids se reservan de las secuencias y
+    cada tabla se carga con un único COPY, sin un INSERT por fila. Foto e informe
+    no se importan aquí.
+    """
+    if len(pruebas) > IMPORTACION_MAX:
+        return JSONResponse({"error": f"Se admiten hasta {IMPORTACION_MAX} pruebas por importación"}, status_code=400)
+    for i, prueba in enumerate(pruebas):
+        if not isinstance(prueba, dict) or not prueba.get("fecha"):
+            return JSONResponse({"error": f"La prueba {i} no tiene fecha"}, status_code=400)
+
     try:
-        conn = get_connection()
+        with conexion() as conn:
+            cur = conn.cursor()
+            ids_prueba = _reservar_ids(cur, "prueba", len(pruebas))
+            ids_participante = iter(_reservar_ids(cur, "participantes", sum(len(p.get("usuarios", [])) for p in pruebas)))
+
+            filas_prueba, filas_participantes, filas_enlaces, filas_series = [], [], [], []
+            for id_prueba, prueba in zip(ids_prueba, pruebas):
+                filas_prueba.append((id_prueba, *(prueba.get(c) for c in COLUMNAS_IMPORTACION)))
+                for id_usuario in prueba.get("usuarios", []):
+                    id_participante = next(ids_participante)
+                    filas_participantes.append((id_participante, id_usuario))
+                    filas_enlaces.append((id_prueba, id_participante))
+                for id_serie in prueba.get("series", []):
+                    filas_series.append((id_prueba, id_serie))
+
+            _copiar(cur, "prueba", ("id", "fecha_inspeccion", *COLUMNAS_IMPORTACION[1:]), filas_prueba)
+            _copiar(cur, "participantes", ("id", "id_usuario"), filas_participantes)
+            _copiar(cur, "prueba_participantes", ("id_prueba", "id_participante"), filas_enlaces)
+            _copiar(cur, "prueba_series", ("id_prueba", "id_serie"), filas_series)
+
+            conn.commit()
+            cur.close()
+        cache.invalidar("pruebas")
+        return JSONResponse({"mensaje": "Pruebas importadas correctamente", "ids": ids_prueba})
+    except PoolAgotado:
+        raise
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+def _leer_series():
+    with conexion() as conn:
         cur = conn.cursor()
         cur.execute("SELECT id, nro_serie FROM serie ORDER BY id ASC")
         filas = cur.fetchall()
         cur.close()
-        conn.close()
-        series = [{"id": fila[0], "nro_serie": fila[1]} for fila in filas]
-        return JSONResponse(series)
+    return [{"id": fila[0], "nro_serie": fila[1]} for fila in filas]
+
+@router.get("/series")
+def obtener_series(request: Request):
+    try:
+        return respuesta_json(request, "series", _leer_series, etiquetas=("series",))
+    except PoolAgotado:
+        raise
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
+LIMITE_PAGINA = 50
+LIMITE_PAGINA_MAX = 200
+
 @router.get("/obtener_pruebas")
-def obtener_pruebas():
+def obtener_pruebas(request: Request, limite: int = LIMITE_PAGINA, despues: int = None, desde: date = None,
+                    hasta: date = None, decision: str = None, id_municion: int = None, lote: str = None):
+    """
+    Página de pruebas ordenadas por id (paginación por cursor: despues = último id
+    recibido). Solo devuelve metadatos; la foto y el informe se piden aparte por
+    sus URLs. Si hay más resultados, el cursor siguiente va en X-Siguiente-Cursor.
+    """
+    limite = min(max(limite, 1), LIMITE_PAGINA_MAX)
+    condiciones, params = [], []
+    for condicion, valor in (("p.id > %s", despues), ("p.fecha_inspeccion >= %s", desde),
+                             ("p.fecha_inspeccion <= %s", hasta), ("p.decision = %s", decision),
+                             ("p.id_municion = %s", id_municion), ("p.lote = %s", lote)):
+        if valor is not None:
+            condiciones.append(condicion)
+            params.append(valor)
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT p.id, p.fecha_inspeccion, s.nro_serie, mun.calibre, 
-                   p.base, p.altura, p.area_impactos, p.decision,
-                   encode(p.foto, 'base64') AS foto_b64,
-                   encode(p.informe, 'base64') AS informe_b64
-            FROM prueba p
-            LEFT JOIN prueba_series ps ON p.id = ps.id_prueba
-            LEFT JOIN serie s ON ps.id_serie = s.id
-            LEFT JOIN municion mun ON p.id_municion = mun.id
-            ORDER BY p.id ASC
-        """)
-        filas = cur.fetchall()
-        cur.close()
-        conn.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            # Se pagina sobre prueba (una fila por prueba) y recién después se unen las series
+            cur.execute(f"""
+                WITH pagina AS (
+                    SELECT p.id, p.fecha_inspeccion, p.id_municion, p.base, p.altura, p.area_impactos,
+                           p.decision, (p.foto_hash IS NOT NULL OR p.foto IS NOT NULL) AS tiene_foto,
+                           (p.informe_hash IS NOT NULL OR p.informe IS NOT NULL) AS tiene_informe
+                    FROM prueba p
+                    {where}
+                    ORDER BY p.id ASC
+                    LIMIT %s
+                )
+                SELECT pg.id, pg.fecha_inspeccion, s.nro_serie, mun.calibre,
+                       pg.base, pg.altura, pg.area_impactos, pg.decision, pg.tiene_foto, pg.tiene_informe
+                FROM pagina pg
+                LEFT JOIN prueba_series ps ON pg.id = ps.id_prueba
+                LEFT JOIN serie s ON ps.id_serie = s.id
+                LEFT JOIN municion mun ON pg.id_municion = mun.id
+                ORDER BY pg.id ASC
+            """, (*params, limite + 1))
+            filas = cur.fetchall()
+            cur.close()
 
         datos = {}
         for fila in filas:
-            id_prueba, fecha, nro_serie, calibre, base, altura, area, decision, foto_b64, informe_b64 = fila
+            id_prueba, fecha, nro_serie, calibre, base, altura, area, decision, tiene_foto, tiene_informe = fila
             if id_prueba not in datos:
                 datos[id_prueba] = {
                     "nro": id_prueba,
@@ -184,32 +350,134 @@ def obtener_pruebas():
                 "area": float(area) if area else 0,
                 "estado": decision if decision else "-",
                 "fecha": fecha.isoformat() if fecha else None,
-                "foto": foto_b64,
-                "informe": informe_b64
+                "foto": str(request.url_for("obtener_foto_prueba", id_prueba=id_prueba)) if tiene_foto else None,
+                "informe": str(request.url_for("obtener_informe_prueba", id_prueba=id_prueba)) if tiene_informe else None
             })
 
-        return JSONResponse(list(datos.values()))
+        pruebas = list(datos.values())
+        headers = {}
+        if len(pruebas) > limite:
+            pruebas = pruebas[:limite]
+            headers["X-Siguiente-Cursor"] = str(pruebas[-1]["nro"])
+        return JSONResponse(pruebas, headers=headers)
+    except PoolAgotado:
+        raise
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
-@router.get("/resumen_pruebas")
-def resumen_pruebas():
-    try:
-        conn = get_connection()
+def _respuesta_blob(request: Request, id_prueba: int, columna: str, media_type: str, nombre: str):
+    """
+    Foto o informe de la prueba. Los del blob store se sirven por bloques desde el
+    archivo, con el hash como ETag y su mtime como Last-Modified; las filas antiguas
+    con el contenido en la columna bytea usan el md5 calculado en la BD.
+    """
+    with conexion() as conn:
         cur = conn.cursor()
-        
-        cur.execute("SELECT COUNT(*) FROM prueba")
-        total = cur.fetchone()[0]
+        cur.execute(f"SELECT {columna}_hash, md5({columna}) FROM prueba WHERE id = %s", (id_prueba,))
+        fila = cur.fetchone()
+        if fila is None or (fila[0] is None and fila[1] is None):
+            cur.close()
+            return JSONResponse({"error": "No encontrado"}, status_code=404)
+        hash_, md5 = fila
+        if hash_ is None:
+            etag = f'"{md5}"'
+            headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+            if etag in request.headers.get("if-none-match", ""):
+                cur.close()
+                return Response(status_code=304, headers=headers)
+            cur.execute(f"SELECT {columna} FROM prueba WHERE id = %s", (id_prueba,))
+            contenido = cur.fetchone()[0]
+            cur.close()
+            headers["Content-Disposition"] = f'inline; filename="{nombre}"'
+            return Response(content=bytes(contenido), media_type=media_type, headers=headers)
+        cur.close()
+
+    ruta = blobs.ruta(hash_)
+    if ruta is None:
+        return JSONResponse({"error": "No encontrado"}, status_code=404)
+    modificado = int(os.stat(ruta).st_mtime)
+    etag = f'"{hash_}"'
+    headers = {"ETag": etag, "Last-Modified": formatdate(modificado, usegmt=True), "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        no_modificado = etag in if_none_match
+    elif if_modified_since is not None:
+        try:
+            no_modificado = modificado <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            no_modificado = False
+    else:
+        no_modificado = False
+    if no_modificado:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(ruta, media_type=media_type, headers=headers, filename=nombre, content_disposition_type="inline")
 
-        cur.execute("SELECT COUNT(*) FROM prueba WHERE decision = 'APROBADO'")
-        aprobados = cur.fetchone()[0]
+@router.get("/{id_prueba}/foto", name="obtener_foto_prueba")
+def obtener_foto_prueba(request: Request, id_prueba: int):
+    return _respuesta_blob(request, id_prueba, "foto", "image/jpeg", f"prueba_{id_prueba}.jpg")
 
-        cur.execute("SELECT COUNT(*) FROM prueba WHERE decision = 'RECHAZADO'")
-        rechazados = cur.fetchone()[0]
+@router.get("/{id_prueba}/informe", name="obtener_informe_prueba")
+def obtener_informe_prueba(request: Request, id_prueba: int):
+    return _respuesta_blob(request, id_prueba, "informe", "application/pdf", f"prueba_{id_prueba}.pdf")
 
+AGRUPACIONES = {
+    "calibre": "mun.calibre",
+    "lote": "p.lote",
+    "mes": "to_char(date_trunc('month', p.fecha_inspeccion), 'YYYY-MM')",
+}
+
+def _calcular_resumen(desde: date, hasta: date, agrupar: str):
+    condiciones, params = [], []
+    for condicion, valor in (("p.fecha_inspeccion >= %s", desde), ("p.fecha_inspeccion <= %s", hasta)):
+        if valor is not None:
+            condiciones.append(condicion)
+            params.append(valor)
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    # Conteos condicionales en una sola pasada; con agrupar, GROUPING SETS da el total y los grupos juntos
+    clave = AGRUPACIONES[agrupar] if agrupar else "NULL"
+    agrupacion = f"GROUP BY GROUPING SETS ((), ({clave}))" if agrupar else ""
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {"GROUPING(" + clave + ")" if agrupar else "1"} AS es_total, {clave} AS clave,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE p.decision = 'APROBADO') AS aprobados,
+                   COUNT(*) FILTER (WHERE p.decision = 'RECHAZADO') AS rechazados
+            FROM prueba p
+            {"LEFT JOIN municion mun ON p.id_municion = mun.id" if agrupar == "calibre" else ""}
+            {where}
+            {agrupacion}
+        """, params)
+        filas = cur.fetchall()
         cur.close()
-        conn.close()
 
-        return {"total": total, "aprobados": aprobados, "rechazados": rechazados}
+    resumen = {"total": 0, "aprobados": 0, "rechazados": 0}
+    grupos = []
+    for es_total, clave_grupo, total, aprobados, rechazados in filas:
+        conteos = {"total": total, "aprobados": aprobados, "rechazados": rechazados}
+        if es_total:
+            resumen = conteos
+        else:
+            grupos.append({"clave": clave_grupo, **conteos})
+    if agrupar:
+        resumen["agrupar"] = agrupar
+        resumen["grupos"] = sorted(grupos, key=lambda g: (g["clave"] is None, str(g["clave"])))
+    return resumen
+
+@router.get("/resumen_pruebas")
+def resumen_pruebas(desde: date = None, hasta: date = None, agrupar: str = None):
+    """
+    Totales de pruebas (aprobadas/rechazadas), opcionalmente en un rango de fechas
+    y agrupados por calibre, lote o mes. Se sirve desde cache; guardar, actualizar
+    e importar pruebas lo invalidan.
+    """
+    if agrupar is not None and agrupar not in AGRUPACIONES:
+        return JSONResponse({"error": f"agrupar debe ser uno de: {', '.join(AGRUPACIONES)}"}, status_code=400)
+    try:
+        return cache.obtener(("resumen_pruebas", desde, hasta, agrupar),
+                             lambda: _calcular_resumen(desde, hasta, agrupar), etiquetas=("pruebas",))
+    except PoolAgotado:
+        raise
     except Exception as e:
         return {"error": str(e)}
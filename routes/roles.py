@@ -1,14 +1,17 @@
-from fastapi import APIRouter
-from database.connection import get_connection
+from fastapi import APIRouter, Request
+from database.connection import conexion
+from database.cache import respuesta_json
 
 router = APIRouter()
 
+def _leer_roles():
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, nombre_rol FROM rol")
+        roles = [{"id": r[0], "nombre_rol": r[1]} for r in cur.fetchall()]
+        cur.close()
+    return roles
+
 @router.get("/roles")
-def get_roles():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, nombre_rol FROM rol")
-    roles = [{"id": r[0], "nombre_rol": r[1]} for r in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return roles
\ No newline at end of file
+def get_roles(request: Request):
+    return respuesta_json(request, "roles", _leer_roles, etiquetas=("roles",))
\ No newline at end of file
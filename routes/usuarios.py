@@ -1,7 +1,9 @@
-from fastapi import APIRouter, UploadFile, Form, Body
-from fastapi.responses import JSONResponse
-from database.connection import get_connection
-from passlib.context import CryptContext
+from fastapi import APIRouter, UploadFile, Form, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from database.connection import conexion, PoolAgotado
+from seguridad import contrasenas
+from storage import imagenes
 from psycopg2 import errors
 import base64
 import traceback
@@ -10,19 +12,10 @@ import bcrypt
 from passlib.hash import bcrypt as passlib_bcrypt
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 logger = logging.getLogger(__name__)
 
-@router.post("/login")
-async def login(data: dict = Body(...)):
-    conn = None
-    try:
-        usuario = data.get("usuario")
-        contrasena = data.get("contrasena")
-        if not usuario or not contrasena:
-            return JSONResponse({"success": False, "message": "Debe ingresar usuario y contraseña"}, status_code=400)
-
-        conn = get_connection()
+def _buscar_usuario(usuario: str):
+    with conexion() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT u.id, u.contrasena, u.estado, u.rol_id, u.primer_inicio,
@@ -32,27 +25,39 @@ async def login(data: dict = Body(...)):
             WHERE u.usuario=%s
         """, (usuario,))
         user = cur.fetchone()
+        cur.close()
+    return user
+
+def _guardar_hash(id_usuario: int, nuevo_hash: str):
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE usuario SET contrasena=%s WHERE id=%s", (nuevo_hash, id_usuario))
+        conn.commit()
+        cur.close()
+
+@router.post("/login")
+async def login(data: dict = Body(...)):
+    try:
+        usuario = data.get("usuario")
+        contrasena = data.get("contrasena")
+        if not usuario or not contrasena:
+            return JSONResponse({"success": False, "message": "Debe ingresar usuario y contraseña"}, status_code=400)
 
+        # Las consultas van al threadpool y bcrypt a su propio pool acotado: el event loop no se bloquea
+        user = await run_in_threadpool(_buscar_usuario, usuario)
         if not user:
-            cur.close()
-            conn.close()
             return JSONResponse({"success": False, "message": "Usuario no encontrado"}, status_code=400)
         if user[2] != "true":
-            cur.close()
-            conn.close()
             return JSONResponse({"success": False, "message": "Usuario desactivado"}, status_code=400)
 
-        stored_hash = user[1]
-        valid = pwd_context.verify(contrasena, stored_hash)
+        try:
+            valid, new_hash = await contrasenas.verificar(contrasena, user[1])
+        except contrasenas.Saturado:
+            return JSONResponse({"success": False, "message": "Servidor ocupado, intente nuevamente"},
+                                status_code=503, headers={"Retry-After": "1"})
 
-        if valid and pwd_context.needs_update(stored_hash):
-            new_hash = pwd_context.hash(contrasena)
-            cur.execute("UPDATE usuario SET contrasena=%s WHERE id=%s", (new_hash, user[0]))
-            conn.commit()
-            stored_hash = new_hash
-
-        cur.close()
-        conn.close()
+        if new_hash is not None:
+            await run_in_threadpool(_guardar_hash, user[0], new_hash)
 
         if not valid:
             return JSONResponse({"success": False, "message": "Contraseña incorrecta"}, status_code=400)
@@ -71,33 +76,87 @@ async def login(data: dict = Body(...)):
             }
         })
 
+    except PoolAgotado:
+        raise
     except Exception:
-        if conn:
-            conn.rollback()
-            conn.close()
         logger.error("Error en /usuarios/login:\n%s", traceback.format_exc())
         return JSONResponse({"success": False, "message": "Error interno del servidor"}, status_code=500)
 
-@router.get("/")
-def listar_usuarios():
-    conn = None
-    try:
-        conn = get_connection()
+LIMITE_PAGINA = 50
+LIMITE_PAGINA_MAX = 200
+
+def _completar_miniaturas(ids):
+    """
+    Genera y guarda la miniatura de usuarios con foto anterior a las miniaturas;
+    pasa una sola vez por usuario, la primera vez que aparece en el listado.
+    Devuelve {id: miniatura} (sin los que no tienen una imagen válida).
+    """
+    with conexion() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT u.id, u.nombres, u.ap_paterno, u.ap_materno, u.ci, u.fecha_nacimiento,
-                   u.usuario, u.correo, u.celular, u.rango, r.nombre_rol, u.foto, u.estado
-            FROM usuario u
-            JOIN rol r ON u.rol_id = r.id
-            ORDER BY u.id
-        """)
-        usuarios = cur.fetchall()
+        cur.execute("SELECT id, foto FROM usuario WHERE id = ANY(%s) AND foto_miniatura IS NULL AND foto IS NOT NULL",
+                    (list(ids),))
+        miniaturas = {}
+        for id_usuario, foto in cur.fetchall():
+            miniatura = imagenes.miniatura(bytes(foto))
+            if miniatura is not None:
+                miniaturas[id_usuario] = miniatura
+        if miniaturas:
+            cur.execute("""
+                UPDATE usuario u SET foto_miniatura = m.miniatura
+                FROM unnest(%s::int[], %s::bytea[]) AS m(id, miniatura)
+                WHERE u.id = m.id
+            """, (list(miniaturas), list(miniaturas.values())))
+            conn.commit()
         cur.close()
-        conn.close()
+    return miniaturas
+
+@router.get("/")
+def listar_usuarios(request: Request, limite: int = LIMITE_PAGINA, despues: int = None, buscar: str = None):
+    """
+    Página de usuarios ordenada por id (despues = último id recibido) con búsqueda
+    opcional por nombre, apellidos, usuario, CI o correo. La foto va como miniatura;
+    la original se pide a fotoUrl (/usuarios/{id}/foto). El cursor siguiente va en X-Siguiente-Cursor.
+    """
+    limite = min(max(limite, 1), LIMITE_PAGINA_MAX)
+    condiciones, params = [], []
+    if despues is not None:
+        condiciones.append("u.id > %s")
+        params.append(despues)
+    if buscar:
+        patron = "%" + buscar.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        condiciones.append("""(u.nombres ILIKE %s OR u.ap_paterno ILIKE %s OR u.ap_materno ILIKE %s
+                               OR u.usuario ILIKE %s OR u.ci::text ILIKE %s OR u.correo ILIKE %s)""")
+        params.extend([patron] * 6)
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT u.id, u.nombres, u.ap_paterno, u.ap_materno, u.ci, u.fecha_nacimiento,
+                       u.usuario, u.correo, u.celular, u.rango, r.nombre_rol, u.foto_miniatura, u.estado,
+                       u.foto IS NOT NULL AS tiene_foto
+                FROM usuario u
+                JOIN rol r ON u.rol_id = r.id
+                {where}
+                ORDER BY u.id
+                LIMIT %s
+            """, (*params, limite + 1))
+            usuarios = cur.fetchall()
+            cur.close()
+
+        headers = {}
+        if len(usuarios) > limite:
+            usuarios = usuarios[:limite]
+            headers["X-Siguiente-Cursor"] = str(usuarios[-1][0])
+
+        sin_miniatura = [u[0] for u in usuarios if u[13] and u[11] is None]
+        miniaturas = _completar_miniaturas(sin_miniatura) if sin_miniatura else {}
 
         lista_usuarios = []
         for u in usuarios:
-            foto_base64 = "data:image/jpeg;base64," + base64.b64encode(u[11]).decode("utf-8") if u[11] else None
+            foto_url = str(request.url_for("obtener_foto_usuario", id=u[0])) if u[13] else None
+            miniatura = u[11] if u[11] is not None else miniaturas.get(u[0])
+            foto = "data:image/jpeg;base64," + base64.b64encode(miniatura).decode("utf-8") if miniatura else None
             lista_usuarios.append({
                 "id": u[0],
                 "nombres": u[1],
@@ -110,30 +169,46 @@ def listar_usuarios():
                 "celular": u[8],
                 "rango": u[9],
                 "rol": u[10],
-                "foto": foto_base64,
+                "foto": foto,
+                "fotoUrl": foto_url,
                 "estado": True if u[12] == "true" else False
             })
-        return lista_usuarios
+        return JSONResponse(lista_usuarios, headers=headers)
+    except PoolAgotado:
+        raise
     except Exception:
-        if conn:
-            conn.rollback()
-            conn.close()
         logger.error("Error en listar_usuarios:\n%s", traceback.format_exc())
         return JSONResponse({"error": "Error interno del servidor"}, status_code=500)
 
-@router.put("/{id}")
-async def actualizar_usuario(id: int, usuario: str = Form(...), correo: str = Form(...), foto: UploadFile = None):
-    conn = None
-    try:
-        conn = get_connection()
+@router.get("/{id}/foto", name="obtener_foto_usuario")
+def obtener_foto_usuario(request: Request, id: int):
+    """Foto original con ETag (md5 calculado en la BD); 304 si el cliente ya la tiene."""
+    with conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT md5(foto) FROM usuario WHERE id = %s", (id,))
+        fila = cur.fetchone()
+        if fila is None or fila[0] is None:
+            cur.close()
+            return JSONResponse({"error": "No encontrado"}, status_code=404)
+        etag = f'"{fila[0]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("if-none-match", ""):
+            cur.close()
+            return Response(status_code=304, headers=headers)
+        cur.execute("SELECT foto FROM usuario WHERE id = %s", (id,))
+        foto = cur.fetchone()[0]
+        cur.close()
+    return Response(content=bytes(foto), media_type="image/jpeg", headers=headers)
+
+def _actualizar_usuario(id: int, usuario: str, correo: str, foto_bytes, miniatura_bytes):
+    with conexion() as conn:
         cur = conn.cursor()
-        foto_bytes = await foto.read() if foto else None
         if foto_bytes:
             cur.execute("""
                 UPDATE usuario
-                SET usuario=%s, correo=%s, foto=%s
+                SET usuario=%s, correo=%s, foto=%s, foto_miniatura=%s
                 WHERE id=%s
-            """, (usuario, correo, foto_bytes, id))
+            """, (usuario, correo, foto_bytes, miniatura_bytes, id))
         else:
             cur.execute("""
                 UPDATE usuario
@@ -142,12 +217,22 @@ async def actualizar_usuario(id: int, usuario: str = Form(...), correo: str = Fo
             """, (usuario, correo, id))
         conn.commit()
         cur.close()
-        conn.close()
+
+@router.put("/{id}")
+async def actualizar_usuario(id: int, usuario: str = Form(...), correo: str = Form(...), foto: UploadFile = None):
+    try:
+        # La foto se lee antes de tomar la conexión para no retenerla durante la subida
+        foto_bytes = await foto.read() if foto else None
+        miniatura_bytes = None
+        if foto_bytes:
+            miniatura_bytes = await run_in_threadpool(imagenes.miniatura, foto_bytes)
+            if miniatura_bytes is None:
+                return JSONResponse({"error": "La foto no es una imagen válida"}, status_code=400)
+        await run_in_threadpool(_actualizar_usuario, id, usuario, correo, foto_bytes, miniatura_bytes)
         return JSONResponse({"mensaje": "Usuario actualizado correctamente"})
+    except PoolAgotado:
+        raise
     except Exception as e:
-        if conn:
-            conn.rollback()
-            conn.close()
         logger.error("Error en actualizar_usuario:\n%s", traceback.format_exc())
         if isinstance(e, errors.UniqueViolation):
             if "usuario_usuario_key" in str(e):
@@ -158,18 +243,15 @@ async def actualizar_usuario(id: int, usuario: str = Form(...), correo: str = Fo
 
 @router.delete("/{id}")
 def eliminar_usuario(id: int):
-    conn = None
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("UPDATE usuario SET estado='false' WHERE id=%s", (id,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE usuario SET estado='false' WHERE id=%s", (id,))
+            conn.commit()
+            cur.close()
         return JSONResponse({"mensaje": "Usuario desactivado correctamente"})
+    except PoolAgotado:
+        raise
     except Exception:
-        if conn:
-            conn.rollback()
-            conn.close()
         logger.error("Error en eliminar_usuario:\n%s", traceback.format_exc())
         return JSONResponse({"error": "Error interno del servidor"}, status_code=500)
@@ -0,0 +1,81 @@
+"""
+Verificación y hash de contraseñas fuera del event loop.
+
+bcrypt consume decenas de ms de CPU por verificación; corriendo en el loop,
+un pico de logins congela todo el servidor (incluidos los streams de video).
+Aquí corre en un pool de hilos propio y acotado (bcrypt libera el GIL): si ya
+hay HASH_WORKERS verificaciones en curso y HASH_COLA_MAX esperando, el pedido
+se rechaza de inmediato con Saturado en lugar de acumular latencia.
+"""
+import os
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_COLA_MAX = int(os.environ.get("HASH_COLA_MAX", 32))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class Saturado(Exception):
+    """El pool de hash tiene la cola llena."""
+
+
+class EjecutorAcotado:
+    def __init__(self, workers: int, cola_max: int, nombre: str):
+        self.workers = max(1, workers)
+        self.cola_max = max(0, cola_max)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=nombre)
+        # Cupos = trabajos en curso + en cola; se liberan cuando el trabajo termina de verdad
+        self._cupos = threading.BoundedSemaphore(self.workers + self.cola_max)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._completados = 0
+        self._rechazados = 0
+
+    async def ejecutar(self, fn, *args):
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._rechazados += 1
+            raise Saturado()
+        with self._lock:
+            self._pendientes += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._liberar)
+        return await asyncio.wrap_future(future)
+
+    def _liberar(self, _future):
+        with self._lock:
+            self._pendientes -= 1
+            self._completados += 1
+        self._cupos.release()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "cola_max": self.cola_max,
+                "pendientes": self._pendientes,
+                "completados": self._completados,
+                "rechazados": self._rechazados,
+            }
+
+
+ejecutor = EjecutorAcotado(HASH_WORKERS, HASH_COLA_MAX, "hash")
+
+
+def _verificar(contrasena: str, hash_guardado: str):
+    valida = pwd_context.verify(contrasena, hash_guardado)
+    if valida and pwd_context.needs_update(hash_guardado):
+        return True, pwd_context.hash(contrasena)
+    return valida, None
+
+
+async def verificar(contrasena: str, hash_guardado: str):
+    """(válida, hash nuevo o None): el rehash por needs_update va en el mismo trabajo."""
+    return await ejecutor.ejecutar(_verificar, contrasena, hash_guardado)
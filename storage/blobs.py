@@ -0,0 +1,87 @@
+"""
+Almacenamiento de blobs (fotos e informes) direccionado por contenido.
+
+Cada blob se guarda bajo el sha256 de su contenido, así que subir dos veces el
+mismo archivo no lo escribe de nuevo y la tabla prueba solo guarda el hash. El
+contenido se copia por bloques mientras se calcula el hash, sin cargarlo entero
+en memoria. BlobStore define la interfaz; LocalBlobStore usa el sistema de
+archivos local (BLOB_DIR).
+"""
+import os
+import hashlib
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.environ.get("BLOB_DIR", "data/blobs")
+BLOQUE = 1024 * 1024
+
+
+class BlobStore:
+    def guardar_archivo(self, archivo):
+        """Guarda el contenido de un archivo abierto (modo binario); devuelve (hash, tamaño)."""
+        raise NotImplementedError
+
+    def guardar_bytes(self, datos: bytes):
+        raise NotImplementedError
+
+    def ruta(self, hash_: str):
+        """Ruta local del blob, o None si no existe."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, raiz: str = BLOB_DIR):
+        self.raiz = raiz
+        self._tmp = os.path.join(raiz, "tmp")
+
+    def _destino(self, hash_: str):
+        return os.path.join(self.raiz, hash_[:2], hash_)
+
+    def guardar_archivo(self, archivo):
+        os.makedirs(self._tmp, exist_ok=True)
+        sha = hashlib.sha256()
+        tamano = 0
+        fd, temporal = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as salida:
+                while True:
+                    bloque = archivo.read(BLOQUE)
+                    if not bloque:
+                        break
+                    sha.update(bloque)
+                    salida.write(bloque)
+                    tamano += len(bloque)
+            hash_ = sha.hexdigest()
+            destino = self._destino(hash_)
+            if os.path.exists(destino):
+                # Mismo contenido ya almacenado: no se reescribe
+                os.remove(temporal)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(temporal, destino)
+            return hash_, tamano
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def guardar_bytes(self, datos: bytes):
+        hash_ = hashlib.sha256(datos).hexdigest()
+        destino = self._destino(hash_)
+        if not os.path.exists(destino):
+            os.makedirs(self._tmp, exist_ok=True)
+            fd, temporal = tempfile.mkstemp(dir=self._tmp)
+            with os.fdopen(fd, "wb") as salida:
+                salida.write(datos)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(temporal, destino)
+        return hash_, len(datos)
+
+    def ruta(self, hash_: str):
+        destino = self._destino(hash_)
+        return destino if os.path.exists(destino) else None
+
+
+blobs = LocalBlobStore()
@@ -0,0 +1,24 @@
+import io
+import logging
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+MINIATURA_LADO = 96
+MINIATURA_CALIDAD = 80
+
+
+def miniatura(datos: bytes, lado: int = MINIATURA_LADO, calidad: int = MINIATURA_CALIDAD):
+    """JPEG de a lo sumo lado x lado (respetando proporción y orientación EXIF); None si no es una imagen."""
+    try:
+        with Image.open(io.BytesIO(datos)) as imagen:
+            # draft() deja que el decodificador JPEG reduzca al leer, sin decodificar a tamaño completo
+            imagen.draft("RGB", (lado * 2, lado * 2))
+            imagen = ImageOps.exif_transpose(imagen).convert("RGB")
+            imagen.thumbnail((lado, lado), Image.LANCZOS)
+            salida = io.BytesIO()
+            imagen.save(salida, "JPEG", quality=calidad, optimize=True)
+            return salida.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("No se pudo generar la miniatura: %s", e)
+        return None
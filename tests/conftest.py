@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from routes import prueba, usuarios
+from storage.blobs import LocalBlobStore
+
+
+class _Cursor:
+    def __init__(self, bd):
+        self.bd = bd
+        self.filas = []
+
+    def execute(self, sql, params=None):
+        self.bd.ejecutadas.append((sql, params))
+        self.filas = self.bd.resultados.pop(0) if self.bd.resultados else []
+
+    def fetchall(self):
+        return self.filas
+
+    def fetchone(self):
+        return self.filas[0] if self.filas else None
+
+    def close(self):
+        pass
+
+
+class _Conexion:
+    def __init__(self, bd):
+        self.bd = bd
+
+    def cursor(self):
+        return _Cursor(self.bd)
+
+    def commit(self):
+        self.bd.commits += 1
+
+
+class BaseFalsa:
+    """
+    Reemplazo de database.connection.conexion para las rutas: registra cada
+    execute como (sql, params) y responde con resultados, una lista de filas por
+    execute en orden (sin más resultados, filas vacías).
+    """
+
+    def __init__(self):
+        self.ejecutadas = []
+        self.resultados = []
+        self.commits = 0
+
+    @contextmanager
+    def conexion(self, timeout=None):
+        yield _Conexion(self)
+
+    def params(self, i=0):
+        return self.ejecutadas[i][1]
+
+
+@pytest.fixture
+def bd(monkeypatch, tmp_path):
+    bd = BaseFalsa()
+    monkeypatch.setattr(prueba, "conexion", bd.conexion)
+    monkeypatch.setattr(usuarios, "conexion", bd.conexion)
+    monkeypatch.setattr(prueba, "blobs", LocalBlobStore(str(tmp_path / "blobs")))
+    return bd
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app, base_url="https://backend.example")
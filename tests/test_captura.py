@@ -0,0 +1,46 @@
+from conf_camara.captura import CaptureSupervisor
+from conf_camara.config import STREAM_MAX_FPS
+from conf_camara.frame_ring import FrameRing
+
+
+class _Proceso:
+    def __init__(self):
+        self.terminado = False
+
+    def poll(self):
+        return 0 if self.terminado else None
+
+    def terminate(self):
+        self.terminado = True
+
+
+def _supervisor():
+    captura = CaptureSupervisor(FrameRing(8, 4, 2), subtype=0, fps=2)
+    captura.process = _Proceso()
+    return captura
+
+
+def test_la_captura_sigue_al_visor_mas_rapido():
+    captura = _supervisor()
+    assert "fps=2," in " ".join(captura.comando("10.0.0.1"))
+    captura.demandar(10)
+    assert captura.fps == 10 and captura.process.terminado and captura._reconfigurar
+    assert "fps=10," in " ".join(captura.comando("10.0.0.1"))
+
+    captura.process = _Proceso()
+    captura.demandar(5)
+    assert captura.fps == 10 and not captura.process.terminado
+
+    captura.liberar_demanda(10)
+    assert captura.fps == 5 and captura.process.terminado
+    captura.process = _Proceso()
+    captura.liberar_demanda(5)
+    assert captura.fps == 2 and captura.process.terminado
+
+
+def test_visor_mas_lento_que_la_deteccion_no_baja_la_tasa():
+    captura = _supervisor()
+    captura.demandar(1)
+    assert captura.fps == 2 and not captura.process.terminado
+    captura.demandar(100)
+    assert captura.fps == STREAM_MAX_FPS
@@ -0,0 +1,112 @@
+import threading
+import numpy as np
+
+from conf_camara import camera
+from conf_camara.tracker import ImpactTracker
+
+HOJA = np.array([100.0, 100.0, 500.0, 400.0])
+ESPURIO = np.array([[200, 200, 210, 210]])
+SIN_IMPACTOS = ESPURIO[:0]
+
+
+class _Ring:
+    def __init__(self, n, sesion):
+        self.n = n
+        self.sesion = sesion
+        self.invalidos = set()
+
+    def esperar(self, seq, timeout=None):
+        if seq >= self.n:
+            self.sesion.detenido = True
+            return seq, None
+        return seq + 1, np.zeros((4, 4, 3), np.uint8)
+
+    def valida(self, seq):
+        return seq not in self.invalidos
+
+
+class _Cambio:
+    def __init__(self, decisiones):
+        self.decisiones = iter(decisiones)
+        self.forzar = False
+        self.reinicios = 0
+
+    def debe_inferir(self, frame):
+        decision = next(self.decisiones)
+        forzar, self.forzar = self.forzar, False
+        return decision or forzar
+
+    def reiniciar(self):
+        self.reinicios += 1
+        self.forzar = True
+
+
+class _Calibracion:
+    def __init__(self):
+        self.frames = []
+
+    def actualizar(self, frame, hoja):
+        self.frames.append(frame)
+
+
+class _Sesion:
+    def __init__(self, decisiones):
+        self.detenido = False
+        self.pause_detection = False
+        self.ultima_deteccion = None
+        self.stop_event = threading.Event()
+        self.ring = _Ring(len(decisiones), self)
+        self.cambio = _Cambio(decisiones)
+        self.calibracion = _Calibracion()
+        self.tracker = ImpactTracker(min_hits=2, max_misses=3)
+        self.publicados = []
+
+    def publicar(self, snapshot):
+        self.publicados.append(snapshot)
+
+
+class _Modelos:
+    listo = True
+
+
+def _correr(monkeypatch, sesion, detecciones):
+    detecciones = iter(detecciones)
+    monkeypatch.setattr(camera, "modelos", _Modelos())
+    monkeypatch.setattr(camera, "procesar_frame", lambda frame: next(detecciones))
+    monkeypatch.setattr(camera, "DETECTION_INTERVAL", 0)
+    camera.detection_loop(sesion)
+
+
+def test_frames_sin_cambio_no_confirman_un_falso_positivo(monkeypatch):
+    # Un solo frame inferido con un impacto espurio, luego muchos frames sin cambios
+    # y después inferencias limpias: el espurio nunca llega a confirmarse
+    decisiones = [True] + [False] * 5 + [True] * 20
+    detecciones = [(HOJA, ESPURIO)] + [(HOJA, SIN_IMPACTOS)] * 20
+    sesion = _Sesion(decisiones)
+    _correr(monkeypatch, sesion, detecciones)
+    assert sesion.tracker.snapshot["impactos"] == []
+    assert all(s["impactos"] == [] for s in sesion.publicados)
+
+
+def test_dos_inferencias_reales_confirman_el_impacto(monkeypatch):
+    decisiones = [True, False, False, True]
+    sesion = _Sesion(decisiones)
+    _correr(monkeypatch, sesion, [(HOJA, ESPURIO)] * 2)
+    assert sesion.tracker.snapshot["hits"] == [2]
+
+
+def test_frame_invalidado_no_actualiza_la_calibracion(monkeypatch):
+    sesion = _Sesion([True, True])
+    sesion.ring.invalidos.add(1)
+    _correr(monkeypatch, sesion, [(HOJA, SIN_IMPACTOS)] * 2)
+    assert len(sesion.calibracion.frames) == 1
+
+
+def test_frame_invalidado_fuerza_inferir_el_siguiente(monkeypatch):
+    # El frame 1 se infiere pero su slot se pisó; el 2 "no cambió" respecto de él
+    # y aun así debe inferirse porque la referencia nunca se publicó
+    sesion = _Sesion([True, False, False])
+    sesion.ring.invalidos.add(1)
+    _correr(monkeypatch, sesion, [(HOJA, ESPURIO), (HOJA, SIN_IMPACTOS)])
+    assert sesion.cambio.reinicios == 1
+    assert sesion.ultima_deteccion[1] is SIN_IMPACTOS
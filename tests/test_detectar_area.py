@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from conf_camara import camera
+from conf_camara.calibracion import CalibracionHoja
+
+HOJA = [300.0, 100.0, 900.0, 600.0]
+
+
+class _Ring:
+    def ultimo(self):
+        return 1, np.zeros((720, 1280, 3), np.uint8)
+
+    def valida(self, seq):
+        return True
+
+
+class _Sesion:
+    camera_id = "cam"
+
+    def __init__(self):
+        self.ring = _Ring()
+        self.calibracion = CalibracionHoja()
+        self.calibracion.actualizar(None, HOJA)
+
+
+class _Modelo:
+    names = {0: "hoja", 1: "impacto"}
+
+
+class _Modelos:
+    version = 1
+
+    def obtener(self):
+        return _Modelo()
+
+
+@pytest.fixture
+def sesion(monkeypatch):
+    sesion = _Sesion()
+    monkeypatch.setattr(camera.registry, "obtener", lambda camara=None: sesion)
+    monkeypatch.setattr(camera, "modelos", _Modelos())
+    return sesion
+
+
+def _detectar(monkeypatch, roi, hoja_roi):
+    """detectar_area con el modelo devolviendo la hoja (relativa al ROI) y un impacto."""
+    data = np.array([[*hoja_roi, 0.9, 0], [hoja_roi[0] + 50, hoja_roi[1] + 50, hoja_roi[0] + 60, hoja_roi[1] + 60, 0.8, 1]],
+                    np.float32)
+    monkeypatch.setattr(camera.cache_roi, "obtener", lambda clave, calcular: data)
+    return camera.detectar_area(*roi)
+
+
+def test_roi_con_la_hoja_recortada_no_pisa_la_calibracion_de_la_sesion(monkeypatch, sesion):
+    estado = sesion.calibracion._estado
+    # El ROI corta la mitad derecha de la hoja: su bbox no coincide con la calibrada
+    resultado = _detectar(monkeypatch, (250, 50, 600, 650), [50, 50, 350, 550])
+    assert resultado["hoja"] == [300, 100, 600, 600]
+    assert resultado["dispersion"]["impactos"] == 1
+    assert sesion.calibracion._estado is estado
+    assert sesion.calibracion.calculos == 1
+
+
+def test_roi_con_la_hoja_completa_usa_la_calibracion_de_la_sesion(monkeypatch, sesion):
+    estado = sesion.calibracion._estado
+    resultado = _detectar(monkeypatch, (200, 50, 1000, 650), [100, 50, 700, 550])
+    assert resultado["hoja"] == [300, 100, 900, 600]
+    assert resultado["dispersion"]["impactos"] == 1
+    assert sesion.calibracion._estado is estado
+    assert sesion.calibracion.calculos == 1
@@ -0,0 +1,45 @@
+import base64
+import io
+from datetime import date
+
+
+def test_pruebas_enlazan_foto_e_informe_con_url_absoluta(bd, client):
+    bd.resultados = [[(7, date(2024, 1, 1), "S-1", "9mm", 10, 20, 1.5, "aprobado", True, True)]]
+    [fila] = client.get("/pruebas/obtener_pruebas").json()
+    [fila] = fila["series"]
+    assert fila["foto"] == "https://backend.example/pruebas/7/foto"
+    assert fila["informe"] == "https://backend.example/pruebas/7/informe"
+
+
+def _usuario(id_usuario, miniatura, tiene_foto):
+    return (id_usuario, "Ana", "P", "Q", 1, None, "ana", "a@x", "1", "cabo", "admin", miniatura, "true", tiene_foto)
+
+
+def _jpeg():
+    from PIL import Image
+    salida = io.BytesIO()
+    Image.new("RGB", (300, 200), "red").save(salida, "JPEG")
+    return salida.getvalue()
+
+
+def test_usuarios_foto_es_data_uri_y_foto_url_absoluta(bd, client):
+    bd.resultados = [[_usuario(3, b"mini", True), _usuario(4, None, False)]]
+    con_foto, sin_foto = client.get("/usuarios/").json()
+    assert con_foto["foto"] == "data:image/jpeg;base64," + base64.b64encode(b"mini").decode()
+    assert con_foto["fotoUrl"] == "https://backend.example/usuarios/3/foto"
+    assert sin_foto["foto"] is None and sin_foto["fotoUrl"] is None
+    # Nadie sin miniatura con foto: no se consulta nada más
+    assert len(bd.ejecutadas) == 1
+
+
+def test_usuario_con_foto_sin_miniatura_la_genera_una_vez(bd, client):
+    bd.resultados = [[_usuario(5, None, True), _usuario(6, None, True)], [(5, _jpeg()), (6, b"no es imagen")]]
+    valida, invalida = client.get("/usuarios/").json()
+    assert valida["foto"].startswith("data:image/jpeg;base64,")
+    assert valida["fotoUrl"] == "https://backend.example/usuarios/5/foto"
+    # Una foto que no es imagen no tiene miniatura: foto queda en null, nunca una URL
+    assert invalida["foto"] is None
+    assert invalida["fotoUrl"] == "https://backend.example/usuarios/6/foto"
+    sql, (ids, miniaturas) = bd.ejecutadas[2]
+    assert "UPDATE usuario" in sql and ids == [5] and len(miniaturas) == 1
+    assert bd.commits == 1
@@ -0,0 +1,62 @@
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conf_camara import camera
+from conf_camara.inference import InferenceScheduler
+
+
+def _predict(imagenes):
+    if any(imagen.size == 0 for imagen in imagenes):
+        raise ValueError("imagen vacía")
+    return [imagen.shape for imagen in imagenes]
+
+
+def test_una_imagen_invalida_no_hace_fallar_al_resto_del_lote():
+    # Un lote grande y una espera larga: los cuatro pedidos van juntos
+    scheduler = InferenceScheduler(_predict, max_batch=4, max_wait_ms=500)
+    imagenes = [np.zeros((4, 4, 3)), np.zeros((0, 4, 3)), np.zeros((2, 2, 3)), np.zeros((3, 1, 3))]
+    futures = [scheduler.submit(imagen) for imagen in imagenes]
+    assert futures[0].result(timeout=5) == (4, 4, 3)
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == (2, 2, 3)
+    assert futures[3].result(timeout=5) == (3, 1, 3)
+    assert scheduler.estadisticas()["total_imagenes"] == 3
+
+
+@pytest.mark.parametrize("roi,esperado", [
+    ((-10, -5, 100, 50), (0, 0, 100, 50)),
+    ((1200, 700, 1400, 900), (1200, 700, 1280, 720)),
+    ((10, 20, 30, 40), (10, 20, 30, 40)),
+])
+def test_recortar_roi(roi, esperado):
+    assert camera.recortar_roi(*roi, 1280, 720) == esperado
+
+
+@pytest.mark.parametrize("roi", [(50, 10, 50, 40), (60, 10, 20, 40), (1300, 0, 1400, 100), (0, -50, 100, -1)])
+def test_roi_vacia(roi):
+    with pytest.raises(camera.RoiInvalida):
+        camera.recortar_roi(*roi, 1280, 720)
+
+
+class _Ring:
+    def ultimo(self):
+        return 1, np.zeros((720, 1280, 3), np.uint8)
+
+
+class _Sesion:
+    camera_id = "cam"
+    ring = _Ring()
+
+
+def test_detectar_area_responde_400_sin_encolar(monkeypatch):
+    encolados = []
+    monkeypatch.setattr(main, "modelo_no_listo", lambda: None)
+    monkeypatch.setattr(camera.registry, "obtener", lambda camara=None: _Sesion())
+    monkeypatch.setattr(camera.scheduler, "submit", encolados.append)
+    r = TestClient(main.app).get("/detecciones_area", params={"x1": 100, "y1": 50, "x2": 100, "y2": 80})
+    assert r.status_code == 400
+    assert encolados == []
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+from conf_camara import network
+
+
+async def _rtsp(reader, writer):
+    await reader.readuntil(b"\r\n\r\n")
+    writer.write(b"RTSP/1.0 401 Unauthorized\r\nCSeq: 1\r\nServer: Camara falsa\r\n\r\n")
+    await writer.drain()
+    writer.close()
+
+
+async def _http(reader, writer):
+    await reader.readuntil(b"\r\n\r\n")
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+    await writer.drain()
+    writer.close()
+
+
+async def _silencioso(reader, writer):
+    # Acepta la conexión y nunca responde
+    await reader.read()
+
+
+async def _con_servidores(prueba):
+    """RTSP en 127.0.0.2, HTTP en 127.0.0.3 y uno mudo en 127.0.0.4, los tres en el mismo puerto."""
+    rtsp = await asyncio.start_server(_rtsp, "127.0.0.2", 0)
+    puerto = rtsp.sockets[0].getsockname()[1]
+    http = await asyncio.start_server(_http, "127.0.0.3", puerto)
+    mudo = await asyncio.start_server(_silencioso, "127.0.0.4", puerto)
+    try:
+        return await prueba(puerto)
+    finally:
+        for servidor in (rtsp, http, mudo):
+            servidor.close()
+
+
+def test_verificar_rtsp_solo_acepta_rtsp():
+    async def prueba(puerto):
+        return await asyncio.gather(*(network.verificar_rtsp(ip, puerto, 0.3, 0.3)
+                                      for ip in ("127.0.0.2", "127.0.0.3", "127.0.0.4", "127.0.0.5")))
+
+    rtsp, http, mudo, cerrado = asyncio.run(_con_servidores(prueba))
+    assert rtsp["ip"] == "127.0.0.2" and rtsp["estado"] == 401 and rtsp["servidor"] == "Camara falsa"
+    assert http is None and mudo is None and cerrado is None
+
+
+def test_descubrir_reporta_solo_la_camara_y_la_recuerda(tmp_path):
+    ruta = str(tmp_path / "conocidas.json")
+
+    async def prueba(puerto):
+        return await network.buscar_camaras(rango="127.0.0.0/29", port=puerto, timeout_conexion=0.3,
+                                            timeout_rtsp=0.3, ruta_conocidas=ruta)
+
+    camaras = asyncio.run(_con_servidores(prueba))
+    assert [(c["ip"], c["conocida"]) for c in camaras] == [("127.0.0.2", False)]
+    with open(ruta) as f:
+        assert [c["ip"] for c in json.load(f)["camaras"]] == ["127.0.0.2"]
+
+
+def test_camara_conocida_evita_el_escaneo(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "conocidas.json")
+
+    def sin_escaneo(rango):
+        raise AssertionError("no debería escanear la subred")
+
+    async def prueba(puerto):
+        with open(ruta, "w") as f:
+            json.dump({"camaras": [{"ip": "127.0.0.2", "puerto": puerto}]}, f)
+        monkeypatch.setattr(network, "redes", sin_escaneo)
+        return await network.buscar_camaras(rango="10.0.0.0/16", port=puerto, timeout_conexion=0.3,
+                                            timeout_rtsp=0.3, ruta_conocidas=ruta)
+
+    camaras = asyncio.run(_con_servidores(prueba))
+    assert [(c["ip"], c["conocida"]) for c in camaras] == [("127.0.0.2", True)]
+
+
+def test_busqueda_completa_escanea_aunque_haya_conocidas(tmp_path):
+    ruta = str(tmp_path / "conocidas.json")
+
+    async def prueba(puerto):
+        with open(ruta, "w") as f:
+            json.dump({"camaras": [{"ip": "127.0.0.2", "puerto": puerto}]}, f)
+        return await network.buscar_camaras(rango="127.0.0.0/29", port=puerto, completo=True,
+                                            timeout_conexion=0.3, timeout_rtsp=0.3, ruta_conocidas=ruta)
+
+    camaras = asyncio.run(_con_servidores(prueba))
+    # La conocida no se vuelve a verificar en el escaneo
+    assert [(c["ip"], c["conocida"]) for c in camaras] == [("127.0.0.2", True)]
+
+
+def test_conocida_que_no_responde_se_olvida_tras_varias_busquedas(tmp_path):
+    ruta = str(tmp_path / "conocidas.json")
+
+    async def prueba(puerto):
+        with open(ruta, "w") as f:
+            json.dump({"camaras": [{"ip": "127.0.0.2", "puerto": puerto}, {"ip": "127.0.0.5", "puerto": puerto}]}, f)
+        estados = []
+        for _ in range(network.DISCOVERY_FALLOS_MAX):
+            camaras = await network.buscar_camaras(rango="10.0.0.0/16", port=puerto, timeout_conexion=0.3,
+                                                   timeout_rtsp=0.3, ruta_conocidas=ruta)
+            assert [c["ip"] for c in camaras] == ["127.0.0.2"]
+            estados.append({c["ip"]: c["fallos"] for c in network.cargar_conocidas(ruta)})
+        return estados
+
+    estados = asyncio.run(_con_servidores(prueba))
+    assert estados == [{"127.0.0.2": 0, "127.0.0.5": 1}, {"127.0.0.2": 0, "127.0.0.5": 2}, {"127.0.0.2": 0}]
+
+
+def test_responder_de_nuevo_reinicia_los_fallos(tmp_path):
+    ruta = str(tmp_path / "conocidas.json")
+    network.guardar_conocidas([], ruta, fallidas={("127.0.0.2", 554)})
+    assert network.cargar_conocidas(ruta) == []
+    with open(ruta, "w") as f:
+        json.dump({"camaras": [{"ip": "127.0.0.2", "puerto": 554, "fallos": 2}]}, f)
+    network.guardar_conocidas([{"ip": "127.0.0.2", "puerto": 554}], ruta)
+    assert network.cargar_conocidas(ruta)[0]["fallos"] == 0
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database.connection import PoolAgotado
+from routes import prueba, usuarios
+
+
+@contextmanager
+def _agotado(timeout=None):
+    raise PoolAgotado("Sin conexiones libres")
+    yield
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(prueba, "conexion", _agotado)
+    monkeypatch.setattr(usuarios, "conexion", _agotado)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("metodo,ruta,cuerpo", [
+    ("GET", "/pruebas/obtener_pruebas", None),
+    ("GET", "/pruebas/series", None),
+    ("GET", "/pruebas/resumen_pruebas", None),
+    ("POST", "/pruebas/guardar_prueba", {"fecha": "2024-01-01"}),
+    ("PUT", "/pruebas/actualizar_prueba/1", {"base": 1}),
+    ("POST", "/pruebas/importar", [{"fecha": "2024-01-01"}]),
+    ("GET", "/usuarios/", None),
+    ("DELETE", "/usuarios/1", None),
+    ("POST", "/usuarios/login", {"usuario": "a", "contrasena": "b"}),
+])
+def test_pool_agotado_responde_503(client, metodo, ruta, cuerpo):
+    r = client.request(metodo, ruta, json=cuerpo)
+    assert r.status_code == 503
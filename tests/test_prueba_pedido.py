@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+
+def _multipart(datos, archivos):
+    """Cuerpo como lo arma un navegador: un input de archivo vacío va con filename=""."""
+    partes = [b'Content-Disposition: form-data; name="datos"\r\n\r\n' + json.dumps(datos).encode()]
+    for campo, (nombre, contenido) in archivos.items():
+        partes.append(f'Content-Disposition: form-data; name="{campo}"; filename="{nombre}"\r\n'
+                      'Content-Type: application/octet-stream\r\n\r\n'.encode() + contenido)
+    cuerpo = b"".join(b"--limite\r\n" + parte + b"\r\n" for parte in partes) + b"--limite--\r\n"
+    return {"content": cuerpo, "headers": {"content-type": "multipart/form-data; boundary=limite"}}
+
+
+def test_archivo_en_blanco_no_reemplaza_la_foto(bd, client):
+    r = client.put("/pruebas/actualizar_prueba/7",
+                   **_multipart({"base": 1}, {"foto": ("", b""), "informe": ("informe.pdf", b"%PDF-1.4")}))
+    assert r.status_code == 200
+    params = bd.params()
+    # (base, altura, area, decision, foto enviada, foto_hash, foto enviada, informe enviado, ...)
+    assert params[4] is False and params[5] is None
+    assert params[7] is True and params[8] is not None
+
+
+def test_archivo_en_blanco_con_datos_vacios_quita_la_foto(bd, client):
+    r = client.put("/pruebas/actualizar_prueba/7", **_multipart({"foto": ""}, {"foto": ("", b"")}))
+    assert r.status_code == 200
+    assert bd.params()[4] is True and bd.params()[5] is None
+
+
+@pytest.mark.parametrize("pedido", [
+    {"content": b"{no es json", "headers": {"content-type": "application/json"}},
+    {"content": b"[1, 2]", "headers": {"content-type": "application/json"}},
+    {"data": {"datos": "{no es json"}, "files": {"foto": ("foto.jpg", b"\xff\xd8")}},
+])
+def test_json_mal_formado_responde_400(bd, client, pedido):
+    assert client.post("/pruebas/guardar_prueba", **pedido).status_code == 400
+    assert client.put("/pruebas/actualizar_prueba/7", **pedido).status_code == 400
+    assert bd.ejecutadas == []
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from conf_camara.camera import impactos_se_solapan
+from conf_camara.reconciliacion import IndiceImpactos
+
+
+def _bbox_int(rnd, ancho=400):
+    x, y = rnd.randint(0, ancho), rnd.randint(0, ancho)
+    return [x, y, x + rnd.randint(0, 12), y + rnd.randint(0, 12)]
+
+
+def _bbox_float(rnd, ancho=400.0):
+    x, y = rnd.uniform(-20, ancho), rnd.uniform(-20, ancho)
+    return [x, y, x + rnd.uniform(0, 12), y + rnd.uniform(0, 12)]
+
+
+@pytest.mark.parametrize("generar", [_bbox_int, _bbox_float])
+@pytest.mark.parametrize("tolerancia", [1, 5, 10, 7.5])
+def test_indice_equivale_a_impactos_se_solapan(generar, tolerancia):
+    rnd = random.Random(f"{generar.__name__}-{tolerancia}")
+    for _ in range(50):
+        # Pocos puntos en un área chica: muchos pares cerca de la tolerancia
+        ancho = rnd.choice([30, 100, 400])
+        conocidos = [generar(rnd, ancho) for _ in range(rnd.randint(0, 30))]
+        consultas = [generar(rnd, ancho) for _ in range(40)]
+        indice = IndiceImpactos(conocidos, tolerancia)
+        esperado = [any(impactos_se_solapan(c, k, tolerancia) for k in conocidos) for c in consultas]
+        assert [indice.cerca(c) for c in consultas] == esperado
+        assert indice.mascara(consultas).tolist() == esperado
+
+
+@pytest.mark.parametrize("tolerancia", [5, 10])
+def test_distancia_igual_a_la_tolerancia_no_coincide(tolerancia):
+    conocido = [100, 100, 110, 110]
+    # Centros a exactamente tolerancia en x, en y y en diagonal 3-4-5
+    consultas = [
+        [100 + tolerancia, 100, 110 + tolerancia, 110],
+        [100, 100 - tolerancia, 110, 110 - tolerancia],
+        [100 + 3 * tolerancia / 5, 100 + 4 * tolerancia / 5, 110 + 3 * tolerancia / 5, 110 + 4 * tolerancia / 5],
+    ]
+    indice = IndiceImpactos([conocido], tolerancia)
+    for consulta in consultas:
+        assert impactos_se_solapan(consulta, conocido, tolerancia) is False
+        assert indice.cerca(consulta) is False
+    # Apenas dentro de la tolerancia sí coincide
+    casi = [100 + tolerancia - 0.5, 100, 110 + tolerancia - 0.5, 110]
+    assert impactos_se_solapan(casi, conocido, tolerancia) and indice.cerca(casi)
+
+
+def test_celdas_negativas_y_borde_de_celda():
+    tolerancia = 10
+    conocido = [-1, -1, -1, -1]
+    indice = IndiceImpactos([conocido], tolerancia)
+    for consulta in ([8.9, -1, 8.9, -1], [-1, -10.9, -1, -10.9], [0, 0, 0, 0]):
+        assert indice.cerca(consulta) == impactos_se_solapan(consulta, conocido, tolerancia)
@@ -0,0 +1,63 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from conf_camara import camera
+from conf_camara.session import SNAPSHOT_VACIO
+from conf_camara.tracker import ImpactTracker
+
+HOJA = np.array([100.0, 100.0, 500.0, 400.0])
+IMPACTOS = np.array([[200, 200, 210, 210], [300, 250, 310, 260]])
+
+
+def test_snapshot_reiniciado_tiene_las_claves_del_vacio():
+    tracker = ImpactTracker(min_hits=2, max_misses=3)
+    for _ in range(2):
+        tracker.actualizar(HOJA, IMPACTOS)
+    assert len(tracker.snapshot["hits"]) == 2
+    cambios = [tracker.actualizar(None, IMPACTOS[:0]) for _ in range(4)]
+    assert cambios == [False, False, False, True]
+    assert tracker.snapshot["hoja"] is None
+    assert tracker.snapshot["hits"] == []
+    assert set(tracker.snapshot) == set(SNAPSHOT_VACIO) - {"version"}
+
+
+class _SesionFalsa:
+    def __init__(self):
+        self.snapshot = dict(SNAPSHOT_VACIO)
+
+    def publicar(self, snapshot):
+        self.snapshot = dict(snapshot, version=self.snapshot["version"] + 1)
+
+
+def test_detecciones_responde_tras_perder_la_hoja(monkeypatch):
+    sesion = _SesionFalsa()
+    tracker = ImpactTracker(min_hits=2, max_misses=3)
+    monkeypatch.setattr(main, "modelo_no_listo", lambda: None)
+    monkeypatch.setattr(camera, "obtener_snapshot", lambda camara=None: sesion.snapshot)
+    client = TestClient(main.app)
+
+    for _ in range(2):
+        if tracker.actualizar(HOJA, IMPACTOS):
+            sesion.publicar(tracker.snapshot)
+    r = client.get("/detecciones")
+    assert r.status_code == 200
+    assert [i["hits"] for i in r.json()["impactos"]] == [2, 2]
+
+    for _ in range(4):
+        if tracker.actualizar(None, IMPACTOS[:0]):
+            sesion.publicar(tracker.snapshot)
+    r = client.get("/detecciones")
+    assert r.status_code == 200
+    assert r.json()["hoja"] is None
+    assert r.json()["impactos"] == []
+
+
+def test_hits_publicados_se_actualizan_en_potencias_de_dos():
+    tracker = ImpactTracker(min_hits=2, max_misses=3)
+    publicados = []
+    for frame in range(1, 18):
+        if tracker.actualizar(HOJA, IMPACTOS):
+            publicados.append((frame, tracker.snapshot["hits"]))
+    # Hoja nueva en el frame 1, confirmación en el 2 y republicación a las 4, 8 y 16 detecciones
+    assert publicados == [(1, []), (2, [2, 2]), (4, [4, 4]), (8, [8, 8]), (16, [16, 16])]